@@ -0,0 +1,90 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import os
+
+
+class OverloadedError(Exception):
+    """同時実行数と待ち行列がいっぱいで受け付けられない場合の例外"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """同時実行数を制限し、あふれたリクエストを待ち行列で待たせるクラス
+
+    待ち行列も満杯の場合や、待ち時間が上限を超えた場合はすぐにOverloadedErrorを送出する。
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, retry_after: Optional[int] = None):
+        self.max_concurrent = max_concurrent or int(os.getenv('MAX_CONCURRENT_SCRAPES', '4'))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('SCRAPE_QUEUE_SIZE', '16'))
+        self.queue_timeout = queue_timeout or float(os.getenv('SCRAPE_QUEUE_TIMEOUT', '30'))
+        self.retry_after = retry_after or int(os.getenv('SCRAPE_RETRY_AFTER', '5'))
+
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def is_full(self) -> bool:
+        """同時実行数と待ち行列がいっぱいかどうか"""
+        return self.active + self.waiting >= self.max_concurrent + self.max_queue
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """実行枠を確保する（確保できなければOverloadedError）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if self.is_full():
+            raise OverloadedError("混雑しているため受け付けられませんでした", self.retry_after)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise OverloadedError("混雑しているため待機がタイムアウトしました", self.retry_after)
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+class _HostSlot:
+    """ホストごとの実行枠と利用中のリクエスト数"""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class HostLimiter:
+    """ホストごとの同時実行数を制限するクラス"""
+
+    def __init__(self, per_host: Optional[int] = None):
+        self.per_host = per_host or int(os.getenv('BATCH_PER_HOST_CONCURRENCY', '2'))
+        self._hosts: Dict[str, _HostSlot] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """ホストの実行枠を確保する（空くまで待機）"""
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = _HostSlot(self.per_host)
+        entry.users += 1
+        try:
+            async with entry.semaphore:
+                yield
+        finally:
+            entry.users -= 1
+            # 使われなくなったホストの枠は破棄する
+            if entry.users == 0 and self._hosts.get(host) is entry:
+                del self._hosts[host]
@@ -0,0 +1,198 @@
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, List, Optional
+from selenium.webdriver.chrome.options import Options  # type: ignore
+from selenium.common.exceptions import WebDriverException  # type: ignore
+from .metrics import span
+from .browser_profile import apply_request_blocking, blocked_url_patterns
+import threading
+import os
+
+if TYPE_CHECKING:
+    from selenium import webdriver  # type: ignore
+
+
+class BrowserPoolTimeout(Exception):
+    """プールからドライバーを取得できなかった場合の例外"""
+
+
+class _PooledDriver:
+    """プール内のドライバーと利用状況"""
+
+    def __init__(self, driver: 'webdriver.Chrome'):
+        self.driver = driver
+        self.base_handle = driver.current_window_handle
+        self.pages_served = 0
+
+
+class BrowserPool:
+    """プロセス内で共有するヘッドレスChromeのプール"""
+
+    def __init__(self, driver_path: str, options: Options, size: Optional[int] = None,
+                 max_pages_per_driver: Optional[int] = None, acquire_timeout: Optional[float] = None):
+        self.driver_path = driver_path
+        self.options = options
+        self.size = size or int(os.getenv('BROWSER_POOL_SIZE', '2'))
+        self.max_pages_per_driver = max_pages_per_driver or int(os.getenv('BROWSER_POOL_MAX_PAGES', '50'))
+        self.acquire_timeout = acquire_timeout or float(os.getenv('BROWSER_POOL_ACQUIRE_TIMEOUT', '60'))
+        self.page_load_timeout = float(os.getenv('BROWSER_PAGE_LOAD_TIMEOUT', '30'))
+        # タブごとにブロックするURLのパターン（leanプロファイル）
+        self.blocked_urls = blocked_url_patterns()
+
+        self._idle: List[_PooledDriver] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _launch(self) -> _PooledDriver:
+        """新しいChromeを起動"""
+        # webdriver.Chromeの読み込みは重いため、ブラウザが必要になるまで遅らせる
+        from selenium import webdriver  # type: ignore
+        from selenium.webdriver.chrome.service import Service  # type: ignore
+        service = Service(self.driver_path)
+        with span('browser_launch'):
+            driver = webdriver.Chrome(service=service, options=self.options)
+        # 応答しないページでタブを占有し続けないようにする
+        driver.set_page_load_timeout(self.page_load_timeout)
+        return _PooledDriver(driver)
+
+    def _discard(self, pooled: _PooledDriver) -> None:
+        """ドライバーを終了してプールの枠を解放"""
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"Browser quit error: {e}")
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, pooled: _PooledDriver) -> bool:
+        """ドライバーが応答するかを確認"""
+        try:
+            return pooled.base_handle in pooled.driver.window_handles
+        except Exception:
+            return False
+
+    def warm_up(self, count: Optional[int] = None) -> int:
+        """指定数（省略時はプールサイズ）のChromeを事前起動"""
+        target = min(count or self.size, self.size)
+        launched = 0
+        while True:
+            with self._cond:
+                if self._closed or self._created >= target:
+                    break
+                self._created += 1
+            try:
+                pooled = self._launch()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+            launched += 1
+        return launched
+
+    def _acquire(self) -> _PooledDriver:
+        """空いているドライバーを取得（なければ起動、上限なら待機）"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("ブラウザプールは終了しています")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(timeout=self.acquire_timeout):
+                    raise BrowserPoolTimeout("ブラウザの空きを待機中にタイムアウトしました")
+
+        try:
+            return self._launch()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, pooled: _PooledDriver, healthy: bool) -> None:
+        """ドライバーをプールに返却（寿命切れ・異常時は再生成対象として破棄）"""
+        with self._cond:
+            closed = self._closed
+        if closed or not healthy or pooled.pages_served >= self.max_pages_per_driver:
+            self._discard(pooled)
+            return
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def page(self) -> Iterator['webdriver.Chrome']:
+        """ページごとに新しいタブを割り当てたドライバーを貸し出す"""
+        with span('browser_acquire'):
+            pooled = self._acquire()
+        driver = pooled.driver
+        healthy = True
+        try:
+            try:
+                driver.switch_to.new_window('tab')
+            except WebDriverException:
+                # 起動済みのChromeがクラッシュしていた場合は作り直す
+                self._discard(pooled)
+                pooled = None
+                pooled = self._acquire()
+                driver = pooled.driver
+                driver.switch_to.new_window('tab')
+            try:
+                apply_request_blocking(driver, self.blocked_urls)
+            except WebDriverException as e:
+                # ブロックできなくてもページの取得は続ける
+                print(f"Request blocking error: {e}")
+            pooled.pages_served += 1
+            yield driver
+        except WebDriverException:
+            healthy = pooled is not None and self._is_healthy(pooled)
+            raise
+        finally:
+            # 作り直しの途中で失敗した場合は破棄済みなので返却しない
+            if pooled is not None:
+                if healthy:
+                    try:
+                        if driver.current_window_handle != pooled.base_handle:
+                            driver.close()
+                        driver.switch_to.window(pooled.base_handle)
+                    except Exception:
+                        healthy = False
+                self._release(pooled, healthy)
+
+    def shutdown(self) -> None:
+        """待機中のドライバーをすべて終了"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(driver_path: str, options: Options) -> BrowserPool:
+    """プロセス共有のブラウザプールを取得（初回呼び出し時に生成）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = BrowserPool(driver_path, options)
+        return _pool
+
+
+def shutdown_browser_pool() -> None:
+    """プロセス共有のブラウザプールを終了"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,130 @@
+from typing import List, Optional
+from selenium.webdriver.chrome.options import Options  # type: ignore
+import threading
+import os
+
+# リソースの種類ごとにブロックするURLのパターン（DOMのテキストだけが必要なので読み込まない）
+RESOURCE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.m4a', '*.ogg', '*.wav', '*.mov', '*.avi'],
+    'stylesheet': ['*.css'],
+}
+DEFAULT_BLOCKED_RESOURCES = 'image,font,media'
+
+# 広告・アクセス解析・動画埋め込みなどのドメイン（本文の取得に不要）
+DEFAULT_BLOCKED_DOMAINS = ','.join([
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'doubleclick.net',
+    'googleadservices.com', 'adservice.google.com', 'connect.facebook.net', 'analytics.twitter.com',
+    'platform.twitter.com', 'bat.bing.com', 'clarity.ms', 'hotjar.com', 'yjtag.jp',
+    'ads-twitter.com', 'criteo.com', 'criteo.net', 'adsrvr.org', 'taboola.com', 'outbrain.com',
+    'youtube.com/embed', 'player.vimeo.com', 'cdn.ampproject.org',
+])
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def get_profile_name() -> str:
+    """Chromeのプロファイル名（lean: 軽量化、full: 従来どおりすべて読み込む）"""
+    return os.getenv('BROWSER_PROFILE', 'lean').lower()
+
+
+def build_chrome_options(profile: Optional[str] = None) -> Options:
+    """ヘッドレスChromeの起動オプションを作成"""
+    profile = profile or get_profile_name()
+    options = Options()
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-infobars')
+    if profile != 'lean':
+        options.add_argument('--window-size=1920,1080')
+        return options
+
+    # 描画サイズを小さくし、画像のデコード・音声・バックグラウンド通信を止める
+    options.add_argument(f"--window-size={os.getenv('BROWSER_WINDOW_SIZE', '1280,800')}")
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_argument('--mute-audio')
+    options.add_argument('--autoplay-policy=user-gesture-required')
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--disable-component-update')
+    options.add_argument('--disable-default-apps')
+    options.add_argument('--disable-sync')
+    options.add_argument('--disable-notifications')
+    options.add_argument('--no-first-run')
+    options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+        'profile.default_content_setting_values.geolocation': 2,
+        'profile.default_content_setting_values.media_stream': 2,
+        'profile.default_content_setting_values.plugins': 2,
+        'profile.default_content_setting_values.popups': 2,
+    })
+    # DOMContentLoadedで制御を戻す（以降の待機はPageWaiterがDOMの変化を見て判断する）
+    options.page_load_strategy = os.getenv('BROWSER_PAGE_LOAD_STRATEGY', 'eager')
+    return options
+
+
+def blocked_url_patterns(profile: Optional[str] = None) -> List[str]:
+    """Network.setBlockedURLsに渡すURLのパターン（leanプロファイルのみ）"""
+    profile = profile or get_profile_name()
+    if profile != 'lean':
+        return []
+    patterns: List[str] = []
+    for resource in _split(os.getenv('BROWSER_BLOCKED_RESOURCES', DEFAULT_BLOCKED_RESOURCES)):
+        for pattern in RESOURCE_PATTERNS.get(resource.lower(), []):
+            # クエリ文字列付きのURLにも一致させる
+            patterns.extend([pattern, pattern + '?*'])
+    for domain in _split(os.getenv('BROWSER_BLOCKED_DOMAINS', DEFAULT_BLOCKED_DOMAINS)):
+        patterns.append(f'*{domain}*')
+    return patterns
+
+
+def apply_request_blocking(driver, patterns: List[str]) -> None:
+    """現在のタブで指定パターンのリクエストをブロック（CDPはタブごとに設定が必要）"""
+    if not patterns:
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+_options: Optional[Options] = None
+_options_lock = threading.Lock()
+
+
+def get_chrome_options() -> Options:
+    """プロセス共有のChromeの起動オプションを取得"""
+    global _options
+    with _options_lock:
+        if _options is None:
+            _options = build_chrome_options()
+        return _options
+
+
+_driver_path: Optional[str] = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_chrome_driver_path() -> str:
+    """ChromeDriverのパスを取得（解決はプロセスで1回だけ行う）
+
+    CHROME_DRIVER_PATHが指定されていればそれを使い、なければChromeDriverManagerで
+    インストールする（ファイル操作・通信が発生するため結果をキャッシュする）。
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = os.getenv('CHROME_DRIVER_PATH')
+        if _driver_path is None:
+            try:
+                from webdriver_manager.chrome import ChromeDriverManager  # type: ignore
+                # ChromeDriverの自動インストール
+                _driver_path = ChromeDriverManager().install()
+            except Exception as e:
+                print(f"ChromeDriverManager error: {e}")
+                _driver_path = '/usr/local/bin/chromedriver'
+        return _driver_path
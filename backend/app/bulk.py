@@ -0,0 +1,313 @@
+"""保存済みのHTMLから企業情報を一括で抽出するCLI
+
+使い方:
+    python -m app.bulk archive/ --output results.jsonl --processes 8
+    python -m app.bulk pages.jsonl.gz --output results.jsonl --llm
+
+入力は次のどちらか。
+- ディレクトリ: 企業ごとのサブディレクトリにHTMLファイルを置く（index.htmlをメインページとして扱う）。
+  サブディレクトリにurl.txtがあれば、その内容を企業のURLとする。
+- JSONL（.jsonl / .jsonl.gz）: 1行1ページで {"company": ..., "url": ..., "html": ...}。
+  同じ企業のページは連続した行に置く（企業ごとの最初の行をメインページとして扱う）。
+
+HTMLの解析はCPUを使うため、企業をまとめたチャンク単位でプロセスプールに分配する。
+結果は1行1社のJSONLで、処理が終わった企業から追記する。出力ファイルが既にあれば
+書き込み済みの企業を飛ばして再開する。
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import multiprocessing
+import traceback
+import argparse
+import asyncio
+import gzip
+import json
+import time
+import os
+from .scraper import CompanyScraper
+from .fetcher import decode_html
+from .pipeline import build_error_response, build_raw_text, apply_raw_text_option, find_unchanged, save_result
+from .llm_processor import get_llm_processor
+from .lifecycle import shutdown
+
+HTML_EXTENSIONS = ('.html', '.htm')
+MAIN_PAGE_NAMES = ('index.html', 'index.htm')
+
+
+def iter_directory(root: str) -> Iterator[Dict]:
+    """企業ごとのサブディレクトリからページの一覧を作る（HTMLはワーカーが読み込む）"""
+    for name in sorted(os.listdir(root)):
+        company_dir = os.path.join(root, name)
+        if not os.path.isdir(company_dir):
+            continue
+        paths = []
+        for directory, _, files in os.walk(company_dir):
+            paths.extend(os.path.join(directory, f) for f in files if f.lower().endswith(HTML_EXTENSIONS))
+        if not paths:
+            continue
+        relative = sorted(os.path.relpath(path, company_dir).replace(os.sep, '/') for path in paths)
+        # メインページを先頭にする
+        relative.sort(key=lambda path: path.lower() not in MAIN_PAGE_NAMES)
+
+        url_file = os.path.join(company_dir, 'url.txt')
+        base_url = name
+        if os.path.exists(url_file):
+            with open(url_file, 'r', encoding='utf-8') as f:
+                base_url = f.read().strip() or name
+        base_url = base_url.rstrip('/')
+        yield {
+            'company': name,
+            'url': base_url,
+            'pages': [{'url': f"{base_url}/{path}", 'path': os.path.join(company_dir, path)} for path in relative],
+        }
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """1行1ページのJSONLから連続する同じ企業の行をまとめる"""
+    opener = gzip.open if path.endswith('.gz') else open
+    company: Optional[Dict] = None
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                key = record.get('company') or record['url']
+                page = {'url': record['url'], 'html': record['html']}
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipped invalid record at line {line_number}: {str(e)}")
+                continue
+            if company is not None and company['company'] != key:
+                yield company
+                company = None
+            if company is None:
+                company = {'company': key, 'url': record['url'], 'pages': []}
+            company['pages'].append(page)
+    if company is not None:
+        yield company
+
+
+def iter_companies(source: str) -> Iterator[Dict]:
+    """入力の種類に応じて企業を列挙"""
+    if os.path.isdir(source):
+        return iter_directory(source)
+    return iter_jsonl(source)
+
+
+def read_checkpoint(output: str) -> Set[str]:
+    """出力済みの企業を取得（書き込み途中で止まった最後の行は削除する）"""
+    done: Set[str] = set()
+    if not os.path.exists(output):
+        return done
+    valid_size = 0
+    with open(output, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(json.loads(line)['company'])
+            except (ValueError, KeyError, TypeError):
+                break
+            valid_size += len(line)
+    if valid_size < os.path.getsize(output):
+        with open(output, 'r+b') as f:
+            f.truncate(valid_size)
+    return done
+
+
+_scraper: Optional[CompanyScraper] = None
+
+
+def _init_worker() -> None:
+    global _scraper
+    _scraper = CompanyScraper()
+
+
+def _load_pages(company: Dict) -> List[Tuple[str, str]]:
+    pages = []
+    for page in company['pages']:
+        if 'html' in page:
+            pages.append((page['url'], page['html']))
+        else:
+            with open(page['path'], 'rb') as f:
+                pages.append((page['url'], decode_html(f.read())))
+    return pages
+
+
+def extract_chunk(companies: List[Dict]) -> List[Dict]:
+    """企業のチャンクを抽出（ワーカープロセスで実行）"""
+    results = []
+    for company in companies:
+        try:
+            scraped_data = _scraper.extract_from_html(company['url'], _load_pages(company))
+            results.append({'company': company['company'], 'url': company['url'], 'scraped_data': scraped_data})
+        except Exception as e:
+            print(f"Extraction error ({company['company']}): {traceback.format_exc()}")
+            results.append({'company': company['company'], 'url': company['url'],
+                            'error': f"抽出に失敗しました: {str(e)}"})
+    return results
+
+
+def _chunks(companies: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(companies)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def build_record(item: Dict, include_raw_text: bool) -> Dict:
+    """LLMを使わない場合の出力行（ルールベースの抽出結果と確信度）"""
+    if 'error' in item:
+        result = build_error_response(item['error'])
+    else:
+        scraped_data = item['scraped_data']
+        basic_info = {key: value for key, value in scraped_data.items()
+                      if key not in ('fetch_tiers', 'text_blocks', 'page_hashes', 'confidence')}
+        basic_info["raw_text"] = build_raw_text(scraped_data, include_raw_text)
+        result = {
+            "message": "Success",
+            "basic_info": basic_info,
+            "confidence": scraped_data["confidence"],
+            "page_hashes": scraped_data["page_hashes"],
+        }
+    apply_raw_text_option(result, include_raw_text)
+    return {'company': item['company'], 'url': item['url'], **result}
+
+
+async def _analyze(item: Dict, include_analysis: bool, force: bool, include_raw_text: bool,
+                   slots: asyncio.Semaphore) -> Dict:
+    """抽出結果をLLMで処理してAPIと同じ形式の結果を返す"""
+    if 'error' in item:
+        return build_error_response(item['error'])
+    url, scraped_data = item['url'], item['scraped_data']
+    if not force:
+        stored = await asyncio.to_thread(find_unchanged, url, scraped_data, include_analysis, include_raw_text)
+        if stored is not None:
+            return stored
+    async with slots:
+        try:
+            result = await get_llm_processor().process_company_info(scraped_data, include_analysis)
+        except Exception as e:
+            print(f"LLM Error ({item['company']}): {str(e)}")
+            return build_error_response(f"LLM処理中にエラーが発生しました: {str(e)}",
+                                        build_raw_text(scraped_data, include_raw_text))
+    if "error" in result:
+        return result
+    basic_info = {**result["basic_info"], "raw_text": build_raw_text(scraped_data, include_raw_text)}
+    response = {"message": "Success", "basic_info": basic_info, "analysis": result["analysis"]}
+    changed = await asyncio.to_thread(save_result, url, scraped_data, result, include_analysis)
+    if changed is not None:
+        response["changed"] = changed
+    return response
+
+
+async def analyze_batch(items: List[Dict], include_analysis: bool, force: bool,
+                        concurrency: int, include_raw_text: bool) -> List[Dict]:
+    """抽出結果をまとめてLLMで処理（同時に呼び出す数はconcurrencyまで）"""
+    slots = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_analyze(item, include_analysis, force, include_raw_text, slots)
+                                     for item in items))
+    records = []
+    for item, result in zip(items, results):
+        apply_raw_text_option(result, include_raw_text)
+        records.append({'company': item['company'], 'url': item['url'], **result})
+    return records
+
+
+def run_bulk(source: str, output: str, processes: int, chunk_size: int = 16, overwrite: bool = False,
+             use_llm: bool = False, include_analysis: bool = True, llm_batch_size: int = 8,
+             llm_concurrency: int = 4, force: bool = False, include_raw_text: bool = False) -> int:
+    """入力の企業を抽出して出力ファイルに追記し、今回処理した企業数を返す"""
+    if overwrite and os.path.exists(output):
+        os.remove(output)
+    done = read_checkpoint(output)
+    if done:
+        print(f"Resuming: {len(done)} companies already in {output}")
+    companies = (company for company in iter_companies(source) if company['company'] not in done)
+
+    started = time.perf_counter()
+    written = 0
+    pending_llm: List[Dict] = []
+    loop = asyncio.new_event_loop() if use_llm else None
+
+    def write(out, records: List[Dict]) -> None:
+        nonlocal written
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        # チャンクごとに書き出し、中断しても書き込み済みの企業から再開できるようにする
+        out.flush()
+        written += len(records)
+        elapsed = time.perf_counter() - started
+        print(f"Processed {written} companies ({written / elapsed:.1f}/s)")
+
+    def flush_llm(out) -> None:
+        if pending_llm:
+            write(out, loop.run_until_complete(analyze_batch(
+                pending_llm, include_analysis, force, llm_concurrency, include_raw_text)))
+            pending_llm.clear()
+
+    # Chromeやスレッドを抱えたままforkしないようspawnで起動する
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker)
+    try:
+        with open(output, 'a', encoding='utf-8') as out:
+            chunks = _chunks(companies, chunk_size)
+            in_flight = set()
+            # 読み込み済みのHTMLでメモリを使い切らないよう、処理中のチャンク数を制限する
+            for chunk in islice(chunks, processes * 2):
+                in_flight.add(executor.submit(extract_chunk, chunk))
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    next_chunk = next(chunks, None)
+                    if next_chunk is not None:
+                        in_flight.add(executor.submit(extract_chunk, next_chunk))
+                    items = future.result()
+                    if not use_llm:
+                        write(out, [build_record(item, include_raw_text) for item in items])
+                        continue
+                    pending_llm.extend(items)
+                    if len(pending_llm) >= llm_batch_size:
+                        flush_llm(out)
+            if use_llm:
+                flush_llm(out)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if loop is not None:
+            loop.close()
+            shutdown()
+    print(f"Finished: {written} companies in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保存済みのHTMLから企業情報を一括で抽出")
+    parser.add_argument('source', help="企業ごとのサブディレクトリを持つディレクトリ、または1行1ページのJSONL")
+    parser.add_argument('--output', '-o', required=True, help="結果を追記するJSONLファイル")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="解析に使うプロセス数（既定値: CPUコア数）")
+    parser.add_argument('--chunk-size', type=int, default=16, help="1回にワーカーへ渡す企業数")
+    parser.add_argument('--overwrite', action='store_true', help="出力ファイルを作り直す（既定では続きから再開）")
+    parser.add_argument('--llm', action='store_true', help="抽出結果をLLMで処理する")
+    parser.add_argument('--no-analysis', action='store_true', help="LLMでは基本情報だけを処理し、分析は行わない")
+    parser.add_argument('--llm-batch-size', type=int, default=8, help="まとめてLLMで処理する企業数")
+    parser.add_argument('--llm-concurrency', type=int,
+                        default=int(os.getenv('BATCH_CONCURRENCY', os.getenv('SCRAPE_WORKERS', '4'))),
+                        help="LLMの同時呼び出し数（既定値: BATCH_CONCURRENCY）")
+    parser.add_argument('--force', action='store_true', help="ページの内容が前回と同じ企業もLLMで処理し直す")
+    parser.add_argument('--raw-text', action='store_true', help="抽出したテキスト全体を出力に含める")
+    args = parser.parse_args()
+
+    run_bulk(
+        args.source, args.output, max(1, args.processes), chunk_size=max(1, args.chunk_size),
+        overwrite=args.overwrite, use_llm=args.llm, include_analysis=not args.no_analysis,
+        llm_batch_size=max(1, args.llm_batch_size), llm_concurrency=max(1, args.llm_concurrency),
+        force=args.force, include_raw_text=args.raw_text,
+    )
+
+
+if __name__ == "__main__":
+    main()
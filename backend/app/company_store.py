@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+from .frontier import normalize_url
+
+
+def hash_texts(texts: List[str]) -> str:
+    """ページの正規化済みテキストのハッシュ"""
+    return hashlib.sha256('\n'.join(texts).encode('utf-8')).hexdigest()
+
+
+def combine_hashes(page_hashes: Dict[str, str]) -> str:
+    """企業のページごとのハッシュをまとめたハッシュ（ページの順序には依存しない）"""
+    digest = hashlib.sha256()
+    for url, content_hash in sorted(page_hashes.items()):
+        digest.update(f"{url}\t{content_hash}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CompanyStore:
+    """企業ごとのページのハッシュ・抽出結果・LLMの出力を保存するSQLiteのストア
+
+    再取得したページの内容が前回と同じなら保存済みの結果を返せるようにし、
+    内容が変わった企業だけをLLMで処理し直す。変更があった時刻も記録するので、
+    ある時刻以降に変わった企業を一覧できる。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv('COMPANY_DB', '.cache/companies.db')
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS companies (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                result TEXT NOT NULL,
+                has_analysis INTEGER NOT NULL,
+                first_seen_at REAL NOT NULL,
+                checked_at REAL NOT NULL,
+                changed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS company_pages (
+                company_url TEXT NOT NULL,
+                page_url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                changed_at REAL NOT NULL,
+                PRIMARY KEY (company_url, page_url)
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS companies_changed_at ON companies (changed_at)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """企業のキー（表記ゆれのあるURLを同じ企業として扱う）"""
+        return normalize_url(url) or url
+
+    def get(self, url: str) -> Optional[Dict]:
+        """保存済みの企業を取得"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, content_hash, result, has_analysis, first_seen_at, checked_at, changed_at '
+                'FROM companies WHERE url = ?',
+                (self.make_key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._row_to_company(row)
+
+    def _row_to_company(self, row) -> Dict:
+        keys = ['url', 'content_hash', 'result', 'has_analysis', 'first_seen_at', 'checked_at', 'changed_at']
+        company = dict(zip(keys, row))
+        company['result'] = json.loads(company['result'])
+        company['has_analysis'] = bool(company['has_analysis'])
+        return company
+
+    def find_unchanged(self, url: str, page_hashes: Dict[str, str], include_analysis: bool) -> Optional[Dict]:
+        """ページの内容が前回と同じなら保存済みの結果を返す（確認した時刻も更新する）"""
+        company = self.get(url)
+        if company is None or company['content_hash'] != combine_hashes(page_hashes):
+            return None
+        # 前回は分析なしで処理した企業に分析を求められた場合は処理し直す
+        if include_analysis and not company['has_analysis']:
+            return None
+        with self._lock:
+            self._conn.execute('UPDATE companies SET checked_at = ? WHERE url = ?', (time.time(), company['url']))
+            self._conn.commit()
+        return company
+
+    def save(self, url: str, page_hashes: Dict[str, str], result: Dict, has_analysis: bool) -> bool:
+        """処理結果を保存し、前回から内容が変わったかを返す"""
+        key = self.make_key(url)
+        content_hash = combine_hashes(page_hashes)
+        result_json = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content_hash, first_seen_at, changed_at FROM companies WHERE url = ?', (key,)
+            ).fetchone()
+            changed = row is None or row[0] != content_hash
+            first_seen_at = row[1] if row else now
+            changed_at = now if changed else row[2]
+            self._conn.execute(
+                'INSERT OR REPLACE INTO companies VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, content_hash, result_json, int(has_analysis), first_seen_at, now, changed_at)
+            )
+
+            # ページ単位でも変更時刻を記録する（取得しなくなったページは削除）
+            previous = dict(self._conn.execute(
+                'SELECT page_url, content_hash FROM company_pages WHERE company_url = ?', (key,)
+            ).fetchall())
+            for page_url, page_hash in page_hashes.items():
+                if previous.get(page_url) != page_hash:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO company_pages VALUES (?, ?, ?, ?)',
+                        (key, page_url, page_hash, now)
+                    )
+            for page_url in set(previous) - set(page_hashes):
+                self._conn.execute(
+                    'DELETE FROM company_pages WHERE company_url = ? AND page_url = ?', (key, page_url)
+                )
+            self._conn.commit()
+        return changed
+
+    def changed_since(self, since: float, limit: int = 100) -> List[Dict]:
+        """指定時刻（UNIX時間）以降に内容が変わった企業を変更の古い順に取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT url, content_hash, result, has_analysis, first_seen_at, checked_at, changed_at '
+                'FROM companies WHERE changed_at >= ? ORDER BY changed_at LIMIT ?',
+                (since, limit)
+            ).fetchall()
+            pages = self._conn.execute(
+                'SELECT company_url, page_url FROM company_pages WHERE changed_at >= ? ORDER BY changed_at',
+                (since,)
+            ).fetchall()
+        changed_pages: Dict[str, List[str]] = {}
+        for company_url, page_url in pages:
+            changed_pages.setdefault(company_url, []).append(page_url)
+        companies = []
+        for row in rows:
+            company = self._row_to_company(row)
+            company['changed_pages'] = changed_pages.get(company['url'], [])
+            companies.append(company)
+        return companies
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[CompanyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_company_store() -> Optional[CompanyStore]:
+    """プロセス共有のCompanyStoreを取得（無効化されている場合はNone）"""
+    global _store
+    if os.getenv('COMPANY_STORE_ENABLED', '1') == '0':
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CompanyStore()
+        return _store
+
+
+def close_company_store() -> None:
+    """プロセス共有のCompanyStoreを閉じる"""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -0,0 +1,219 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+import hashlib
+import struct
+import re
+import os
+
+# 企業プロフィールに関係するキーワード（含まれるブロックを優先）
+PROFILE_KEYWORDS = [
+    '会社概要', '企業情報', '会社情報', '企業概要', '会社案内', '事業内容', '事業概要',
+    '会社名', '社名', '商号', '所在地', '住所', '本社', '代表者', '代表取締役', '社長',
+    '設立', '創業', '資本金', '従業員', '社員数', '売上', '沿革', '営業時間', '電話', 'TEL',
+    '取引先', '拠点', '事業所', 'ミッション', 'ビジョン', '理念', '採用', '福利厚生',
+]
+# 企業プロフィールのページと思われるURLの一部
+PROFILE_URL_HINTS = ['company', 'about', 'corporate', 'profile', 'outline', 'overview', 'gaiyou', 'gaiyo']
+
+_postal_pattern = re.compile(r'〒?\d{3}[-−]\d{4}')
+_tel_pattern = re.compile(r'\d{2,4}[-−]\d{2,4}[-−]\d{4}')
+_keyword_pattern = re.compile('|'.join(re.escape(k) for k in PROFILE_KEYWORDS), re.IGNORECASE)
+
+# MinHashのハッシュ関数の最大数（64バイトのblake2bを16ビットずつに分けて使う）
+_MAX_SKETCH_SIZE = 32
+
+
+class _Block:
+    """文脈の候補となるテキストブロック"""
+
+    def __init__(self, position: int, url: str, text: str):
+        self.position = position
+        self.url = url
+        self.text = text
+        self.pages = {url}
+        self.sketch: tuple = ()
+        self.score = 0.0
+        self.tokens = 0
+
+
+class ContextBuilder:
+    """LLMに渡す文脈を作るクラス
+
+    ページをまたいで完全一致・ほぼ一致するブロックを除き、企業プロフィールとの
+    関連度が高いブロックから順にトークン予算に収まるだけ選んで、元の順に並べる。
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, similarity_threshold: float = 0.8,
+                 shingle_size: int = 4, sketch_size: int = 32, band_rows: int = 2):
+        self.token_budget = token_budget or int(os.getenv('LLM_CONTEXT_TOKENS', '8000'))
+        self.similarity_threshold = similarity_threshold
+        self.shingle_size = shingle_size
+        self.sketch_size = sketch_size
+        # LSHの1バンドあたりの行数（32個のハッシュなら2行×16バンド。候補は正確なJaccard係数で確認する）
+        self.band_rows = band_rows
+        if not 0 < sketch_size <= _MAX_SKETCH_SIZE:
+            raise ValueError(f"sketch_size must be between 1 and {_MAX_SKETCH_SIZE}")
+        # 16ビットずつの値をそれぞれ別のハッシュ関数として使う（1シングルあたり1回のハッシュ計算で済む）
+        self._unpack = struct.Struct(f'<{_MAX_SKETCH_SIZE}H').unpack
+        # 1つのバケットで比較するブロック数の上限
+        self.max_comparisons = 20
+        # MinHashの推定値がしきい値よりこれ以上低い候補は正確に比べない（推定の誤差の数倍の余裕）
+        self.estimate_margin = 0.25
+
+    def estimate_tokens(self, text: str) -> int:
+        """トークン数の概算（英数字は約4文字、日本語は約1文字で1トークン）"""
+        ascii_chars = sum(1 for char in text if ord(char) < 128)
+        return int(ascii_chars / 4 + (len(text) - ascii_chars)) + 1
+
+    def _shingles(self, text: str) -> frozenset:
+        """文字n-gramの集合"""
+        size = self.shingle_size
+        return frozenset(text[i:i + size] for i in range(max(1, len(text) - size + 1)))
+
+    def _sketch(self, shingles: frozenset) -> tuple:
+        """文字n-gramのMinHash（ハッシュ関数ごとの最小値の並び）を作成"""
+        unpack = self._unpack
+        rows = [unpack(hashlib.blake2b(shingle.encode('utf-8'), person=b'minhash').digest())
+                for shingle in shingles]
+        # ハッシュ関数（列）ごとの最小値
+        return tuple(map(min, zip(*rows)))[:self.sketch_size]
+
+    def _bands(self, sketch: tuple) -> List[tuple]:
+        """似たブロックの候補を探すためのバケットのキー（LSHのバンド。位置ごとに別のバケットにする）"""
+        rows = self.band_rows
+        return [(i, sketch[i:i + rows]) for i in range(0, len(sketch), rows)]
+
+    def _estimate(self, a: tuple, b: tuple) -> float:
+        """2つのMinHashからJaccard係数を推定（値が一致する位置の割合）"""
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a) if a else 0.0
+
+    def _similarity(self, a: frozenset, b: frozenset) -> float:
+        """2つの文字n-gramの集合のJaccard係数"""
+        common = len(a & b)
+        union = len(a) + len(b) - common
+        return common / union if union else 0.0
+
+    def deduplicate(self, blocks: List[Dict[str, str]]) -> List[_Block]:
+        """完全一致・ほぼ一致するブロックを除く（重複元のページは記録しておく）"""
+        kept: List[_Block] = []
+        exact: Dict[str, _Block] = {}
+        buckets: Dict[tuple, List[_Block]] = {}
+        # 比較したブロックのn-gram（この呼び出しの間だけ保持する）
+        shingle_sets: Dict[int, frozenset] = {}
+
+        for position, block in enumerate(blocks):
+            text = block.get('text', '')
+            if not text:
+                continue
+            url = block.get('url', '')
+            digest = hashlib.sha1(' '.join(text.split()).lower().encode('utf-8')).hexdigest()
+            if digest in exact:
+                exact[digest].pages.add(url)
+                continue
+
+            candidate = _Block(position, url, text)
+            duplicate_of = None
+            bands: List[tuple] = []
+            if len(text) > self.shingle_size * 2:
+                shingles = self._shingles(text)
+                candidate.sketch = self._sketch(shingles)
+                bands = self._bands(candidate.sketch)
+                # 同じバケットに入った直近のブロックだけを比較する
+                # （MinHashは候補探しにだけ使い、推定の誤差で見逃さないよう比較は正確なJaccard係数で行う）
+                seen = set()
+                for band in bands:
+                    for other in buckets.get(band, [])[-self.max_comparisons:]:
+                        if id(other) in seen:
+                            continue
+                        seen.add(id(other))
+                        if self._estimate(candidate.sketch, other.sketch) < self.similarity_threshold - self.estimate_margin:
+                            continue
+                        other_shingles = shingle_sets.get(id(other))
+                        if other_shingles is None:
+                            other_shingles = shingle_sets[id(other)] = self._shingles(other.text)
+                        if self._similarity(shingles, other_shingles) >= self.similarity_threshold:
+                            duplicate_of = other
+                            break
+                    if duplicate_of:
+                        break
+
+            if duplicate_of is not None:
+                duplicate_of.pages.add(url)
+                exact[digest] = duplicate_of
+                continue
+
+            exact[digest] = candidate
+            for band in bands:
+                buckets.setdefault(band, []).append(candidate)
+            kept.append(candidate)
+        return kept
+
+    def score(self, block: _Block, page_count: int) -> float:
+        """企業プロフィールとの関連度を採点"""
+        text = block.text
+        score = 0.0
+        score += 3.0 * len(set(m.group().lower() for m in _keyword_pattern.finditer(text)))
+        if _postal_pattern.search(text):
+            score += 4.0
+        if _tel_pattern.search(text):
+            score += 2.0
+        if any(hint in block.url.lower() for hint in PROFILE_URL_HINTS):
+            score += 2.0
+        # 情報量（長すぎるブロックで得点が偏らないよう上限を設ける）
+        score += min(len(text), 400) / 100
+        # 短い断片（メニュー項目など）は優先度を下げる
+        if len(text) < 8:
+            score -= 2.0
+        # 複数ページに出てくるブロックはナビゲーションやフッターの可能性が高い
+        if page_count > 1 and len(block.pages) > 1:
+            score -= 4.0 * len(block.pages) / page_count
+        return score
+
+    def _select(self, candidates: List[_Block], budget: int) -> List[_Block]:
+        """関連度の高い順に予算に収まるだけ選び、元の順に並べる"""
+        # 点数が負のブロック（ナビゲーションなど）は他に候補がない場合のみ使う
+        useful = [block for block in candidates if block.score >= 0] or candidates
+        selected = []
+        used = 0
+        for block in sorted(useful, key=lambda b: (-b.score, b.position)):
+            if used + block.tokens > budget:
+                continue
+            selected.append(block)
+            used += block.tokens
+        return sorted(selected, key=lambda b: b.position)
+
+    def _prepare(self, blocks: List[Dict[str, str]]) -> List[_Block]:
+        candidates = self.deduplicate(blocks)
+        page_count = len({block.get('url', '') for block in blocks})
+        for block in candidates:
+            block.score = self.score(block, page_count)
+            block.tokens = self.estimate_tokens(block.text)
+        return candidates
+
+    def build(self, blocks: List[Dict[str, str]]) -> str:
+        """トークン予算（概算）に収まる文脈を作成"""
+        selected = self._select(self._prepare(blocks), self.token_budget)
+        return '\n'.join(block.text for block in selected)
+
+    async def build_async(self, blocks: List[Dict[str, str]],
+                          count_tokens: Optional[Callable[[str], Awaitable[int]]] = None) -> str:
+        """文脈を作成し、モデルのトークンカウンターで予算内に収まっているか確認する"""
+        candidates = self._prepare(blocks)
+        budget = self.token_budget
+        selected = self._select(candidates, budget)
+        context = '\n'.join(block.text for block in selected)
+        # 概算が予算の半分以下なら、誤差があっても超えることはないので数えない
+        if count_tokens is None or sum(block.tokens for block in selected) <= self.token_budget // 2:
+            return context
+
+        # 概算と実際のトークン数の差を補正して選び直す（最大3回）
+        for _ in range(3):
+            try:
+                tokens = await count_tokens(context)
+            except Exception as e:
+                print(f"Token count error: {str(e)}")
+                return context
+            if tokens <= self.token_budget:
+                return context
+            budget = int(budget * self.token_budget / tokens * 0.95)
+            context = '\n'.join(block.text for block in self._select(candidates, budget))
+        return context
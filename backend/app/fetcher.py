@@ -0,0 +1,113 @@
+from typing import Dict, Optional
+import httpx  # type: ignore
+import chardet  # type: ignore
+import threading
+import re
+import os
+from .metrics import PAGES
+
+# Content-Type / metaタグからcharsetを取り出すパターン
+_header_charset_pattern = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+_meta_charset_pattern = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client(headers: Dict[str, str]) -> httpx.Client:
+    """プロセス共有のHTTPクライアントを取得（keep-aliveで接続を再利用）"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            client_headers = dict(headers)
+            # brotliは環境によって展開できないため除外
+            client_headers['Accept-Encoding'] = 'gzip, deflate'
+            _client = httpx.Client(
+                headers=client_headers,
+                timeout=float(os.getenv('STATIC_FETCH_TIMEOUT', '10')),
+                follow_redirects=True,
+                # 多数のホストにまたがっても接続を使い回せるよう、待機中の接続を多めに保持する
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+                    max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE', '50')),
+                    keepalive_expiry=30,
+                ),
+            )
+        return _client
+
+
+def close_http_client() -> None:
+    """プロセス共有のHTTPクライアントを閉じる"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+class FetchedPage:
+    """本文を上限のバイト数まで読み込んだレスポンス"""
+
+    def __init__(self, status_code: int, headers: httpx.Headers, content: bytes, truncated: bool):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.truncated = truncated
+
+
+def get_max_page_bytes() -> int:
+    """1ページあたりに読み込むHTMLの上限（バイト）"""
+    return int(float(os.getenv('MAX_PAGE_MB', '2')) * 1024 * 1024)
+
+
+def fetch_limited(client: httpx.Client, url: str, max_bytes: int,
+                  headers: Optional[Dict[str, str]] = None, content_type: str = 'html',
+                  timeout: Optional[float] = None) -> FetchedPage:
+    """本文を最大max_bytesまで読み込む（超えた分は受信せずに接続を閉じる）
+
+    エラー・304・content_typeを含まないレスポンスは本文を読まずに返す（空文字列なら種類を問わない）。
+    timeoutを省略した場合はクライアントの設定を使う。
+    """
+    request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+    with client.stream('GET', url, headers=headers, timeout=request_timeout) as response:
+        chunks = []
+        size = 0
+        truncated = False
+        readable = response.status_code < 300 and content_type in response.headers.get('content-type', '').lower()
+        if readable:
+            for chunk in response.iter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    truncated = True
+                    break
+        return FetchedPage(response.status_code, response.headers, b''.join(chunks)[:max_bytes], truncated)
+
+
+def decode_html(content: bytes, content_type: str = '') -> str:
+    """レスポンスの文字コードを判定してデコード"""
+    encoding = None
+    match = _header_charset_pattern.search(content_type or '')
+    if match:
+        encoding = match.group(1)
+    else:
+        match = _meta_charset_pattern.search(content[:4096])
+        if match:
+            encoding = match.group(1).decode('ascii', 'ignore')
+    if not encoding:
+        encoding = chardet.detect(content[:65536]).get('encoding') or 'utf-8'
+
+    try:
+        return content.decode(encoding, errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+
+def record_tier(tier: str) -> None:
+    """ページを処理した取得方式を記録"""
+    PAGES.inc(tier=tier)
+
+
+def get_tier_counts() -> Dict[str, int]:
+    """取得方式ごとの処理ページ数を取得"""
+    return {key[0]: int(value) for key, value in PAGES.values().items()}
@@ -0,0 +1,184 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse, urlunparse, parse_qsl, urlencode
+import xml.etree.ElementTree as ET
+import heapq
+import re
+
+# リンクテキストのキーワードと加点（企業プロフィールに近いものほど高い）
+ANCHOR_KEYWORDS: Dict[str, float] = {
+    '会社概要': 5.0, '企業情報': 5.0, '会社情報': 5.0, '企業概要': 5.0, '会社案内': 4.0,
+    'company': 4.0, 'about': 4.0, 'corporate': 4.0, 'profile': 3.0, 'overview': 3.0,
+    '事業内容': 3.0, '事業紹介': 3.0, 'business': 2.0, 'アクセス': 2.0, '沿革': 2.0,
+    '代表挨拶': 2.0, 'メッセージ': 1.0, '採用情報': 1.0, 'recruit': 1.0, 'careers': 1.0,
+    'お問い合わせ': 1.0, 'contact': 1.0,
+}
+# URLのパスの区切りごとのキーワードと加点（/company、/about、/corporate/profile など）
+PATH_KEYWORDS: Dict[str, float] = {
+    'company': 4.0, 'about': 4.0, 'aboutus': 4.0, 'about-us': 4.0, 'corporate': 3.0,
+    'profile': 3.0, 'outline': 3.0, 'overview': 3.0, 'gaiyou': 3.0, 'gaiyo': 3.0, 'kaisya': 3.0,
+    'kaisha': 3.0, 'info': 1.0, 'access': 2.0, 'business': 2.0, 'service': 1.0, 'history': 1.0,
+    'message': 1.0, 'recruit': 1.0, 'careers': 1.0, 'contact': 1.0,
+}
+# 企業情報が載っていないことが多いパス（減点）
+PATH_PENALTIES: Dict[str, float] = {
+    'news': 3.0, 'blog': 3.0, 'topics': 3.0, 'press': 2.0, 'event': 2.0, 'column': 2.0,
+    'privacy': 3.0, 'policy': 2.0, 'sitemap': 3.0, 'login': 4.0, 'cart': 4.0, 'search': 3.0,
+    'tag': 3.0, 'category': 2.0, 'page': 1.0, 'en': 1.0,
+}
+# HTML以外のファイル（取得しない）
+_SKIPPED_EXTENSIONS = re.compile(
+    r'\.(pdf|jpe?g|png|gif|webp|svg|ico|css|js|json|xml|zip|gz|docx?|xlsx?|pptx?|mp[34]|mov|avi)$',
+    re.IGNORECASE)
+# 除去するトラッキング用のクエリパラメータ
+_TRACKING_PARAMS = re.compile(r'^(utm_\w+|gclid|fbclid|yclid|mc_cid|mc_eid|_ga)$', re.IGNORECASE)
+_INDEX_FILES = re.compile(r'/(index|default)\.(html?|php|aspx?)$', re.IGNORECASE)
+_loc_pattern = re.compile(r'<loc>\s*([^<\s]+)\s*</loc>')
+_path_token_pattern = re.compile(r'[a-z0-9]+(?:[-_][a-z0-9]+)*')
+
+
+def _site_key(url: str) -> str:
+    """同じサイトかどうかの判定に使うホスト名（www.の有無は区別しない）"""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """比較用にURLを正規化（http(s)以外はNone）
+
+    スキームとホストを小文字にし、www.・既定のポート・フラグメント・トラッキング用の
+    クエリを除き、index.htmlなどは親ディレクトリのURLにまとめる。
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+    scheme = parsed.scheme.lower()
+    if scheme not in ('http', 'https') or not parsed.hostname:
+        return None
+    host = _site_key(url)
+    if parsed.port and not ((scheme == 'http' and parsed.port == 80) or (scheme == 'https' and parsed.port == 443)):
+        host = f"{host}:{parsed.port}"
+    path = _INDEX_FILES.sub('/', parsed.path or '/')
+    path = re.sub(r'/{2,}', '/', path)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                             if not _TRACKING_PARAMS.match(k)))
+    return urlunparse((scheme, host, path, '', query, ''))
+
+
+def parse_sitemap(content: str) -> Tuple[List[str], List[str]]:
+    """sitemap.xmlを解析して（ページのURL, 子のサイトマップのURL）を返す"""
+    try:
+        root = ET.fromstring(content.strip().encode('utf-8'))
+    except ET.ParseError:
+        # 上限で切り詰めたサイトマップなどは、読めた範囲の<loc>だけを使う
+        urls = [url.strip() for url in _loc_pattern.findall(content) if url.strip()]
+        if '<sitemapindex' in content[:1024]:
+            return [], urls
+        return urls, []
+    urls = [element.text.strip() for element in root.iter()
+            if element.tag.endswith('loc') and element.text]
+    # 名前空間に関わらずルート要素の種類で判定する
+    if root.tag.endswith('sitemapindex'):
+        return [], urls
+    return urls, []
+
+
+class CrawlFrontier:
+    """企業情報が載っていそうな順に関連ページを取り出すクロールの待ち行列
+
+    リンクテキストとURLのパスのキーワードで採点し、正規化したURLで重複を除く。
+    同じサイト（www.の有無は同一とみなす）のHTMLページだけを対象にする。
+    """
+
+    def __init__(self, start_url: str, max_pages: int):
+        self.start_url = start_url
+        self.max_pages = max_pages
+        self._site = _site_key(start_url)
+        self._seen = set()
+        # 正規化したURL → 点数・取得に使うURL（正規化前のURLからフラグメントだけ除いたもの）
+        self._scores: Dict[str, float] = {}
+        self._targets: Dict[str, str] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._order = 0
+        self._popped = 0
+        start = normalize_url(start_url)
+        if start:
+            self._seen.add(start)
+
+    def score(self, url: str, anchor_text: str = '') -> float:
+        """リンク先に企業情報が載っている見込みを採点"""
+        score = 0.0
+        text = anchor_text.lower()
+        if text:
+            score += max((weight for keyword, weight in ANCHOR_KEYWORDS.items() if keyword in text), default=0.0)
+            # 長いリンクテキスト（記事タイトルなど）はナビゲーションのリンクより優先度を下げる
+            if len(text) > 30:
+                score -= 1.0
+
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.lower().split('/') if segment]
+        matched = set()
+        for segment in segments:
+            for token in _path_token_pattern.findall(segment.rsplit('.', 1)[0]):
+                for part in {token, *re.split(r'[-_]', token)}:
+                    if part in PATH_KEYWORDS and part not in matched:
+                        matched.add(part)
+                        score += PATH_KEYWORDS[part]
+                    if part in PATH_PENALTIES:
+                        score -= PATH_PENALTIES[part]
+        # 深い階層やクエリ付きのURLは個別の記事・一覧のことが多い
+        score -= 0.3 * max(0, len(segments) - 2)
+        if parsed.query:
+            score -= 1.0
+        return score
+
+    def add(self, href: str, anchor_text: str = '', base_url: Optional[str] = None) -> bool:
+        """リンクを追加（対象外・重複・点数が0以下なら追加しない）"""
+        if not href:
+            return False
+        href = href.strip()
+        if href.startswith(('#', 'mailto:', 'tel:', 'javascript:', 'data:')):
+            return False
+        # 先頭に/がない相対URLもリンク元のページを基準に解決する
+        target = urldefrag(urljoin(base_url or self.start_url, href))[0]
+        normalized = normalize_url(target)
+        if normalized is None or _site_key(normalized) != self._site:
+            return False
+        if _SKIPPED_EXTENSIONS.search(urlparse(normalized).path):
+            return False
+        score = self.score(normalized, anchor_text)
+        if score <= 0:
+            return False
+        if normalized in self._seen:
+            # 取り出し前のURLはより良いリンクテキストの点数で更新する
+            if normalized in self._scores and score > self._scores[normalized]:
+                self._scores[normalized] = score
+                self._push(normalized, score)
+            return False
+        self._seen.add(normalized)
+        self._scores[normalized] = score
+        self._targets[normalized] = target
+        self._push(normalized, score)
+        return True
+
+    def _push(self, url: str, score: float) -> None:
+        self._order += 1
+        heapq.heappush(self._heap, (-score, self._order, url))
+
+    def add_links(self, links: Iterable[Tuple[str, str]], base_url: Optional[str] = None) -> int:
+        """（href, リンクテキスト）の組をまとめて追加し、追加した件数を返す"""
+        return sum(1 for href, text in links if self.add(href, text, base_url))
+
+    def pop(self, count: int) -> List[str]:
+        """点数の高い順に最大count件を取り出す（取得上限を超える分は返さない）"""
+        urls: List[str] = []
+        count = min(count, self.max_pages - self._popped)
+        while self._heap and len(urls) < count:
+            neg_score, _, url = heapq.heappop(self._heap)
+            # 点数を更新した古いエントリは読み飛ばす
+            if self._scores.get(url) != -neg_score:
+                continue
+            del self._scores[url]
+            urls.append(self._targets.pop(url))
+        self._popped += len(urls)
+        return urls
@@ -0,0 +1,183 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple, Type
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import threading
+import time
+import os
+import httpx  # type: ignore
+from selenium.common.exceptions import TimeoutException as BrowserTimeout  # type: ignore
+from .metrics import span, HOST_CIRCUIT
+
+# ホストに原因があるとみなす失敗（タイムアウト・接続エラー）
+DEFAULT_FAILURE_TYPES: Tuple[Type[BaseException], ...] = (
+    TimeoutError, ConnectionError, httpx.TransportError, BrowserTimeout,
+)
+
+
+class HostUnavailableError(Exception):
+    """失敗が続いているホストへのリクエストをすぐに打ち切った場合の例外"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _HostState:
+    """ホストごとの実行枠・間隔・サーキットブレーカーの状態"""
+
+    def __init__(self, limit: int):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.users = 0
+        self.next_allowed = 0.0
+        self.failures = 0
+        self.opened_until = 0.0
+        self.trial_running = False
+        self.crawl_delay: Optional[float] = None
+        self.robots_checked_at = 0.0
+        self.robots_lock = threading.Lock()
+
+
+class HostScheduler:
+    """ホストごとに同時リクエスト数と間隔を制御するクラス
+
+    robots.txtのCrawl-delayがあれば間隔に反映する。タイムアウトや接続エラーが
+    続いたホストは一定時間すぐに失敗させ（サーキットブレーカー）、ワーカーを占有させない。
+    """
+
+    def __init__(self, robots_loader: Optional[Callable[[str], Optional[str]]] = None,
+                 per_host: Optional[int] = None, min_interval: Optional[float] = None,
+                 max_crawl_delay: Optional[float] = None, robots_ttl: Optional[float] = None,
+                 failure_threshold: Optional[int] = None, open_seconds: Optional[float] = None,
+                 max_hosts: int = 10000,
+                 failure_types: Tuple[Type[BaseException], ...] = DEFAULT_FAILURE_TYPES):
+        self.robots_loader = robots_loader
+        self.per_host = per_host or int(os.getenv('HOST_MAX_CONCURRENCY', '4'))
+        self.min_interval = min_interval if min_interval is not None else float(os.getenv('HOST_MIN_INTERVAL', '0.1'))
+        self.max_crawl_delay = max_crawl_delay if max_crawl_delay is not None else float(os.getenv('HOST_MAX_CRAWL_DELAY', '10'))
+        self.robots_ttl = robots_ttl or float(os.getenv('ROBOTS_CACHE_TTL', '3600'))
+        self.failure_threshold = failure_threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+        self.open_seconds = open_seconds or float(os.getenv('CIRCUIT_OPEN_SECONDS', '60'))
+        self.max_hosts = max_hosts
+        self.failure_types = failure_types
+
+        self._hosts: "OrderedDict[str, _HostState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        """ホストの状態を取得（ロック取得済みで呼ぶ。使われていない古いホストから破棄する）"""
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.per_host)
+            if len(self._hosts) > self.max_hosts:
+                for old_host in list(self._hosts)[:len(self._hosts) - self.max_hosts]:
+                    if self._hosts[old_host].users == 0 and old_host != host:
+                        del self._hosts[old_host]
+        self._hosts.move_to_end(host)
+        return state
+
+    def _crawl_delay(self, url: str, state: _HostState) -> float:
+        """robots.txtのCrawl-delay（期限付きでキャッシュ）"""
+        if self.robots_loader is None:
+            return 0.0
+        with state.robots_lock:
+            if time.time() - state.robots_checked_at < self.robots_ttl:
+                return state.crawl_delay or 0.0
+            parsed = urlparse(url)
+            delay = None
+            try:
+                content = self.robots_loader(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+                if content:
+                    parser = RobotFileParser()
+                    # 取得時刻を設定しないとcrawl_delayがNoneを返す
+                    parser.modified()
+                    parser.parse(content.splitlines())
+                    delay = parser.crawl_delay('*')
+            except Exception as e:
+                print(f"robots.txt error ({parsed.netloc}): {str(e)}")
+            state.crawl_delay = min(float(delay), self.max_crawl_delay) if delay else None
+            state.robots_checked_at = time.time()
+            return state.crawl_delay or 0.0
+
+    def _admit(self, host: str, state: _HostState) -> bool:
+        """サーキットブレーカーの確認（開いていれば例外、半開きなら試行中かどうかを返す）"""
+        now = time.monotonic()
+        with self._lock:
+            if state.failures < self.failure_threshold:
+                return False
+            if now < state.opened_until or state.trial_running:
+                HOST_CIRCUIT.inc(event='rejected')
+                retry_after = max(1, int(state.opened_until - now))
+                raise HostUnavailableError(f"応答しない状態が続いているため接続を中止しました: {host}", retry_after)
+            # 期限が過ぎたら1件だけ試す
+            state.trial_running = True
+            return True
+
+    def _record(self, state: _HostState, failed: bool, trial: bool) -> None:
+        with self._lock:
+            if trial:
+                state.trial_running = False
+            if not failed:
+                state.failures = 0
+                return
+            state.failures += 1
+            if state.failures >= self.failure_threshold:
+                if trial or state.failures == self.failure_threshold:
+                    HOST_CIRCUIT.inc(event='opened')
+                state.opened_until = time.monotonic() + self.open_seconds
+
+    def _wait_turn(self, state: _HostState, delay: float) -> None:
+        """前のリクエストの開始から間隔を空ける"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, state.next_allowed)
+            state.next_allowed = start + delay
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """ホストへのリクエストの枠を確保する（失敗が続いているホストはHostUnavailableError）"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            state = self._state(host)
+            state.users += 1
+        try:
+            trial = self._admit(host, state)
+            failed = False
+            try:
+                with span('host_wait'):
+                    delay = max(self.min_interval, self._crawl_delay(url, state))
+                    state.semaphore.acquire()
+                    try:
+                        self._wait_turn(state, delay)
+                    except BaseException:
+                        state.semaphore.release()
+                        raise
+                try:
+                    yield
+                except self.failure_types:
+                    failed = True
+                    raise
+                finally:
+                    state.semaphore.release()
+            finally:
+                self._record(state, failed, trial)
+        finally:
+            with self._lock:
+                state.users -= 1
+
+
+_scheduler: Optional[HostScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_host_scheduler(robots_loader: Optional[Callable[[str], Optional[str]]] = None) -> HostScheduler:
+    """プロセス共有のHostSchedulerを取得（初回呼び出し時に生成）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            robots_enabled = os.getenv('ROBOTS_ENABLED', '1') != '0'
+            _scheduler = HostScheduler(robots_loader if robots_enabled else None)
+        return _scheduler
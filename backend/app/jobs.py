@@ -0,0 +1,188 @@
+from typing import Dict, Optional
+import threading
+import sqlite3
+import random
+import uuid
+import json
+import time
+import os
+
+
+class JobStore:
+    """SQLiteを使ったスクレイピングジョブの永続キュー
+
+    ワーカーはジョブを取得すると一定時間（可視性タイムアウト）の間だけ占有する。
+    ワーカーが落ちて期限が切れたジョブは、別のワーカーが再び取得できる。
+    同じマシン上の複数プロセスから同じデータベースファイルを利用できる（WALモードを使うため、
+    NFSなどのネットワークファイルシステム越しに複数のマシンで共有することはできない）。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, visibility_timeout: Optional[float] = None,
+                 max_attempts: Optional[int] = None, retry_backoff: Optional[float] = None):
+        self.db_path = db_path or os.getenv('JOBS_DB', '.cache/jobs.db')
+        self.visibility_timeout = visibility_timeout or float(os.getenv('JOB_VISIBILITY_TIMEOUT', '300'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+        self.retry_backoff = retry_backoff or float(os.getenv('JOB_RETRY_BACKOFF', '10'))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                worker_id TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                options TEXT
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at)')
+        # 処理オプションの列がない古いデータベースには列を追加する
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'options' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN options TEXT')
+
+    def _row_to_job(self, row) -> Dict:
+        keys = ['id', 'url', 'status', 'attempts', 'max_attempts', 'available_at', 'lease_expires_at',
+                'worker_id', 'result', 'error', 'created_at', 'updated_at', 'options']
+        job = dict(zip(keys, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['options'] = json.loads(job['options']) if job['options'] else {}
+        return job
+
+    def submit(self, url: str, options: Optional[Dict] = None) -> Dict:
+        """ジョブを登録（optionsはワーカーがanalyze_companyに渡す処理オプション）"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, url, status, max_attempts, available_at, created_at, updated_at, options) '
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, url, self.max_attempts, now, now, now, json.dumps(options or {}))
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """ジョブを取得"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """実行可能なジョブを1件取得して占有する（なければNone）"""
+        now = time.time()
+        with self._lock:
+            # 書き込みロックを先に取り、複数ワーカーが同じジョブを取らないようにする
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 試行回数を使い切ったまま期限切れになったジョブは失敗にする
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, worker_id = NULL, lease_expires_at = NULL, "
+                    "updated_at = ? WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+                    ('ワーカーが応答しなくなりました', now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'running' AND lease_expires_at < ?) "
+                    'ORDER BY available_at LIMIT 1',
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_id = ?, "
+                    'lease_expires_at = ?, updated_at = ? WHERE id = ?',
+                    (worker_id, now + self.visibility_timeout, now, row[0])
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """処理中のジョブの占有期限を延長（他のワーカーに取られていればFalse）"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.visibility_timeout, now, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict) -> None:
+        """ジョブを成功として記録"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (json.dumps(result, ensure_ascii=False), now, job_id, worker_id)
+            )
+
+    def fail(self, job_id: str, worker_id: str, error: str, result: Optional[Dict] = None,
+             retryable: bool = True) -> None:
+        """ジョブの失敗を記録（再試行できる場合は指数バックオフで再登録）"""
+        now = time.time()
+        result_json = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ?',
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return
+            attempts, max_attempts = row
+            if retryable and attempts < max_attempts:
+                delay = self.retry_backoff * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, worker_id = NULL, lease_expires_at = NULL, "
+                    "available_at = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                    (error, now + delay, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, result = ?, worker_id = NULL, "
+                    "lease_expires_at = NULL, updated_at = ? WHERE id = ? AND status = 'running'",
+                    (error, result_json, now, job_id)
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """プロセス共有のJobStoreを取得"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def close_job_store() -> None:
+    """プロセス共有のJobStoreを閉じる"""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -0,0 +1,115 @@
+from bs4 import BeautifulSoup, Tag  # type: ignore
+from typing import Dict, Iterable, List, Optional, Set
+import re
+
+# ラベルの次の要素を値とみなすブロック要素
+BLOCK_TAGS = ('div', 'p', 'span')
+
+
+class KeywordMatcher:
+    """複数キーワードを1回の走査でまとめて検索するクラス"""
+
+    def __init__(self, keywords: Iterable[str]):
+        # 大文字小文字を区別しないので小文字で一意にする
+        self.keywords: List[str] = list(dict.fromkeys(k.lower() for k in keywords if k))
+        # 長いキーワードを優先した先読み付きの選択パターン
+        alternation = '|'.join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=({alternation}))', re.IGNORECASE) if alternation else None
+        # 同じ位置から始まる短いキーワード（接頭辞）も漏れなく拾うための対応表
+        self._prefixes: Dict[str, List[str]] = {
+            k: [other for other in self.keywords if other != k and k.startswith(other)]
+            for k in self.keywords
+        }
+
+    def match(self, text: str) -> Set[str]:
+        """テキストに含まれるキーワードの集合を返す"""
+        if not text or self._pattern is None:
+            return set()
+        found: Set[str] = set()
+        for m in self._pattern.finditer(text):
+            keyword = m.group(1).lower()
+            found.add(keyword)
+            found.update(self._prefixes.get(keyword, ()))
+        return found
+
+
+class LabelIndex:
+    """ページ内のラベルと値の対応を1回の走査で作る索引
+
+    th/td、dt/dd、div/p/spanの隣接要素の3種類について、
+    キーワードごとに最初に見つかった値を保持する。
+    """
+
+    def __init__(self, soup: BeautifulSoup, keywords: Iterable[str]):
+        self.matcher = KeywordMatcher(keywords)
+        self.keywords = set(self.matcher.keywords)
+        self.table_hits: Dict[str, str] = {}
+        self.dt_hits: Dict[str, str] = {}
+        self.block_hits: Dict[str, str] = {}
+        self._build(soup)
+
+    def _build(self, soup: BeautifulSoup) -> None:
+        """文書順に1回だけ走査して索引を作成"""
+        pending_th: Set[str] = set()  # 次のtdを待っているキーワード
+        pending_dt: Set[str] = set()  # 次のddを待っているキーワード
+        block_keywords = set(self.keywords)
+
+        # (要素, ブロック要素の内側か, table内か) のスタックで深さ優先に走査
+        stack = [(child, False, False) for child in reversed(list(soup.children))]
+        while stack:
+            node, in_block, in_table = stack.pop()
+            if not isinstance(node, Tag):
+                continue
+            name = node.name
+
+            if name == 'td' and pending_th:
+                value = node.get_text(strip=True)
+                for keyword in pending_th:
+                    self.table_hits[keyword] = value
+                pending_th = set()
+            elif name == 'dd' and pending_dt:
+                value = node.get_text(strip=True)
+                for keyword in pending_dt:
+                    self.dt_hits[keyword] = value
+                pending_dt = set()
+
+            if name == 'th' and in_table:
+                pending_th |= self.matcher.match(node.get_text(strip=True)) - self.table_hits.keys()
+            elif name == 'dt':
+                pending_dt |= self.matcher.match(node.get_text(strip=True)) - self.dt_hits.keys()
+            elif name in BLOCK_TAGS and not in_block and block_keywords:
+                # 外側のブロックのテキストは内側のテキストをすべて含むため、
+                # 最初にキーワードを含むのは常に最も外側のブロックになる
+                matched = self.matcher.match(node.get_text(strip=True)) & block_keywords
+                if matched:
+                    next_element = node.find_next(BLOCK_TAGS)
+                    if next_element:
+                        value = next_element.get_text(strip=True)
+                        for keyword in matched:
+                            self.block_hits[keyword] = value
+                        block_keywords -= matched
+                    else:
+                        # 以降のブロックにも次の要素は存在しない
+                        block_keywords = set()
+
+            child_in_block = in_block or name in BLOCK_TAGS
+            child_in_table = in_table or name == 'table'
+            stack.extend((child, child_in_block, child_in_table) for child in reversed(node.contents))
+
+    def lookup(self, keywords: Iterable[str]) -> Optional[str]:
+        """キーワードの優先順に、表→定義リスト→隣接要素の順で値を探す"""
+        for keyword in keywords:
+            key = keyword.lower()
+            for hits in (self.table_hits, self.dt_hits, self.block_hits):
+                if key in hits:
+                    return hits[key]
+        return None
+
+    def lookup_labeled(self, keywords: Iterable[str]) -> Optional[str]:
+        """表・定義リストのラベルから取れた値だけを探す（隣接要素の推測は含めない）"""
+        for keyword in keywords:
+            key = keyword.lower()
+            for hits in (self.table_hits, self.dt_hits):
+                if key in hits:
+                    return hits[key]
+        return None
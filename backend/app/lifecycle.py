@@ -0,0 +1,54 @@
+"""プロセス共有のコンポーネントの初期化と終了
+
+APIサーバー（lifespan）とジョブのワーカーの起動・終了時に呼ぶ。
+"""
+from .browser_pool import get_browser_pool, shutdown_browser_pool
+from .browser_profile import get_chrome_options, resolve_chrome_driver_path
+from .fetcher import get_http_client, close_http_client
+from .page_cache import get_page_cache, close_page_cache
+from .llm_cache import get_llm_cache, close_llm_cache
+from .llm_processor import get_llm_processor
+from .company_store import get_company_store, close_company_store
+from .scraper import REQUEST_HEADERS
+import time
+import os
+
+
+def warm_up(browser: bool = True) -> None:
+    """初回のリクエストで発生する準備処理を起動時に済ませておく
+
+    HTTPクライアント、キャッシュ、企業ストア、Geminiのモデルを作成し、
+    browserがTrueならChromeDriverのパスを解決してChromeを事前起動する。
+    失敗した項目はリクエスト時に改めて作成する。
+    """
+    started = time.perf_counter()
+    steps = [
+        ('http_client', lambda: get_http_client(REQUEST_HEADERS)),
+        ('page_cache', get_page_cache),
+        ('llm_cache', get_llm_cache),
+        ('company_store', get_company_store),
+        ('llm_processor', get_llm_processor),
+    ]
+    if browser and os.getenv('BROWSER_WARM_UP', '1') != '0':
+        steps.append(('browser_pool', _warm_up_browser_pool))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up error ({name}): {str(e)}")
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+def _warm_up_browser_pool() -> None:
+    pool = get_browser_pool(resolve_chrome_driver_path(), get_chrome_options())
+    launched = pool.warm_up()
+    print(f"Browser pool warmed up: {launched} drivers")
+
+
+def shutdown() -> None:
+    """プール内のChrome、HTTP接続、キャッシュ、ストアを閉じる"""
+    shutdown_browser_pool()
+    close_http_client()
+    close_page_cache()
+    close_llm_cache()
+    close_company_store()
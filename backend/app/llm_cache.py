@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+from .metrics import CACHE_REQUESTS
+
+
+class _OwnerAbandoned(Exception):
+    """実行中の呼び出し元がキャンセルされたことを待機側に伝える例外"""
+
+
+class LLMCache:
+    """LLMの応答キャッシュ（メモリ上のLRU＋任意でSQLiteに永続化）
+
+    同じキーの呼び出しが同時に来た場合は、実行中の1回の結果を共有する。
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 db_path: Optional[str] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('LLM_CACHE_TTL', '3600'))
+        self.max_entries = max_entries or int(os.getenv('LLM_CACHE_MAX_ENTRIES', '256'))
+        self.db_path = db_path if db_path is not None else os.getenv('LLM_CACHE_DB', '')
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self._conn = None
+        if self.db_path:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, text: str) -> str:
+        """モデル名・プロンプト・テキストからキャッシュキーを作成"""
+        digest = hashlib.sha256()
+        for part in (model, prompt, text):
+            data = part.encode('utf-8')
+            # 区切りの曖昧さをなくすため長さを前置する
+            digest.update(len(data).to_bytes(8, 'big'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """キャッシュを取得（期限切れ・未登録はNone）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    return json.loads(json.dumps(entry[1]))
+                del self._entries[key]
+
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                'SELECT value, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+        return json.loads(json.dumps(value))
+
+    def set(self, key: str, value: Dict) -> None:
+        """キャッシュに保存"""
+        now = time.time()
+        stored = json.loads(json.dumps(value))
+        with self._lock:
+            self._remember(key, now, stored)
+            if self._conn is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)',
+                    (key, json.dumps(stored, ensure_ascii=False), now)
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, created_at: float, value: Dict) -> None:
+        """メモリ上のLRUに追加（ロック取得済みで呼ぶ）"""
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Dict]],
+                             cacheable: Callable[[Dict], bool] = lambda result: True,
+                             label: str = 'llm') -> Dict:
+        """キャッシュがあれば返し、なければ計算する（同じキーの同時実行は1回にまとめる）
+
+        labelはメトリクスのcacheラベル（LLMの応答以外を保存する場合に区別する）。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                CACHE_REQUESTS.inc(cache=label, result='hit')
+                return cached
+
+            future = self._inflight.get(key)
+            if future is not None and future.get_loop() is loop:
+                CACHE_REQUESTS.inc(cache=label, result='shared')
+                try:
+                    result = await asyncio.shield(future)
+                    return json.loads(json.dumps(result))
+                except _OwnerAbandoned:
+                    # 実行していた呼び出しがキャンセルされたのでやり直す
+                    continue
+
+            CACHE_REQUESTS.inc(cache=label, result='miss')
+            future = loop.create_future()
+            self._inflight[key] = future
+            try:
+                result = await compute()
+            except asyncio.CancelledError:
+                future.set_exception(_OwnerAbandoned())
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            else:
+                if cacheable(result):
+                    self.set(key, result)
+                future.set_result(result)
+                return result
+            finally:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                # 待機者がいない場合に「取得されなかった例外」の警告が出ないようにする
+                if future.done() and not future.cancelled():
+                    future.exception()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """プロセス共有のLLMキャッシュを取得"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def close_llm_cache() -> None:
+    """プロセス共有のLLMキャッシュを閉じる"""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
@@ -1,81 +1,314 @@
-from typing import Dict, Optional
-import google.generativeai as genai # type: ignore
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+import threading
 import os
 import json
+import re
+from .llm_cache import get_llm_cache
+from .context_builder import ContextBuilder
+from .metrics import span, CACHE_REQUESTS, LLM_CALLS, LLM_TOKENS
 
 load_dotenv()
 
+# 基本情報の項目とLLMへの指示
+BASIC_INFO_FIELDS = {
+    "company_name": "会社名を抽出してください",
+    "business_description": "事業内容を抽出してください",
+    "address": "所在地を抽出してください",
+    "representative": "代表者名を抽出してください",
+    "tel": "電話番号を抽出してください",
+    "business_hours": "営業時間を抽出してください",
+}
+# 分析の項目とLLMへの指示
+ANALYSIS_FIELDS = {
+    "summary": "企業の特徴を100文字程度で要約してください",
+    "investor_analysis": "投資家向けの分析を200文字程度で記述してください",
+    "job_seeker_info": "就職活動者向けの情報を200文字程度で記述してください",
+}
+
 class LLMProcessor:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("Google APIキーが設定されていません")
         
+        # google.generativeaiの読み込みは重いため、最初に使う時点まで遅らせる
+        import google.generativeai as genai  # type: ignore
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.model_name = 'gemini-2.0-flash-exp'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.context_builder = ContextBuilder()
+        # 文脈のトークン数をモデルのトークンカウンターで確認するか
+        self.count_tokens = os.getenv('LLM_COUNT_TOKENS', '1') != '0'
+        # この確信度以上のルールベースの抽出結果はLLMに再抽出させない
+        self.confidence_threshold = float(os.getenv('LLM_FIELD_CONFIDENCE', '0.7'))
+        # 分析の実行方法（inline: 基本情報と同じ呼び出し / separate: 別の呼び出し / off: 実行しない）
+        self.analysis_mode = os.getenv('LLM_ANALYSIS_MODE', 'inline')
 
-    async def process_company_info(self, company_data: Dict) -> Dict[str, str]:
-        """企業情報を解析してLLMで加工"""
-        
-        # プロンプトの構築
-        system_prompt = """
+    async def process_company_info(self, company_data: Dict, include_analysis: bool = True) -> Dict[str, str]:
+        """企業情報を解析してLLMで加工
+
+        ルールベースで確信度の高い項目はそのまま使い、足りない項目だけをLLMに抽出させる。
+        include_analysisがFalseの場合（一括処理など）は分析を行わない。
+        """
+        basic_info, missing = self._split_fields(company_data)
+        inline, separate = self._analysis_plan(include_analysis)
+        analysis = dict.fromkeys(ANALYSIS_FIELDS, "")
+
+        if missing or inline:
+            raw_text = await self._prepare_text(company_data)
+            result = await self._cached_generate(self._build_prompt(missing, inline), raw_text,
+                                                 self._expected_keys(missing, inline))
+            if "error" in result:
+                return result
+            basic_info.update(self._pick_fields(result, missing))
+            if inline:
+                analysis = result.get("analysis", analysis)
+
+        if separate:
+            analysis_result = await self.process_analysis(company_data)
+            if "error" in analysis_result:
+                return analysis_result
+            analysis = analysis_result["analysis"]
+
+        return {"basic_info": basic_info, "analysis": analysis}
+
+    async def process_analysis(self, company_data: Dict) -> Dict:
+        """分析だけを別の呼び出しで行う（基本情報とは別にキャッシュされる）"""
+        raw_text = await self._prepare_text(company_data)
+        return await self._cached_generate(self._build_prompt([], True), raw_text, ("analysis",))
+
+    async def stream_company_info(self, company_data: Dict,
+                                  include_analysis: bool = True) -> AsyncIterator[Tuple[str, Dict]]:
+        """Geminiの応答をストリーミングで受け取り、まとまった部分から順に返す
+
+        basic_info（基本情報が揃った時点）→ analysis_partial（分析の各項目の途中経過）
+        → analysis → result（process_company_infoと同じ形式の最終結果）の順にイベントを生成する。
+        """
+        basic_info, missing = self._split_fields(company_data)
+        inline, separate = self._analysis_plan(include_analysis)
+        analysis = dict.fromkeys(ANALYSIS_FIELDS, "")
+        raw_text = await self._prepare_text(company_data) if missing or inline or separate else ""
+
+        # LLMに聞く項目がなければ基本情報はすぐに確定する
+        basic_info_sent = not missing
+        if basic_info_sent:
+            yield "basic_info", dict(basic_info)
+
+        calls = []
+        if missing or inline:
+            calls.append((self._build_prompt(missing, inline), self._expected_keys(missing, inline)))
+        if separate:
+            calls.append((self._build_prompt([], True), ("analysis",)))
+
+        for system_prompt, required in calls:
+            result = None
+            async for name, data in self._stream_generate(system_prompt, raw_text, required):
+                if name == "basic_info":
+                    basic_info.update(self._pick_fields({"basic_info": data}, missing))
+                    basic_info_sent = True
+                    yield "basic_info", dict(basic_info)
+                elif name == "analysis_partial":
+                    yield name, data
+                else:
+                    result = data
+            if "error" in result:
+                yield "result", result
+                return
+            if missing and not basic_info_sent:
+                basic_info.update(self._pick_fields(result, missing))
+                basic_info_sent = True
+                yield "basic_info", dict(basic_info)
+            if "analysis" in result:
+                analysis = result["analysis"]
+
+        if inline or separate:
+            yield "analysis", analysis
+        yield "result", {"basic_info": basic_info, "analysis": analysis}
+
+    def _split_fields(self, company_data: Dict) -> Tuple[Dict[str, str], List[str]]:
+        """確信度の高い抽出結果と、LLMに抽出させる項目に分ける"""
+        confidence = company_data.get("confidence") or {}
+        # 項目の順番を保つため、LLMに抽出させる項目もNoneで用意しておく
+        resolved = dict.fromkeys(BASIC_INFO_FIELDS)
+        missing = []
+        for field in BASIC_INFO_FIELDS:
+            value = company_data.get(field)
+            if value and confidence.get(field, 0.0) >= self.confidence_threshold:
+                resolved[field] = value
+            else:
+                missing.append(field)
+        return resolved, missing
+
+    def _analysis_plan(self, include_analysis: bool) -> Tuple[bool, bool]:
+        """分析を（基本情報と同じ呼び出しで行うか, 別の呼び出しで行うか）"""
+        if not include_analysis or self.analysis_mode == 'off':
+            return False, False
+        if self.analysis_mode == 'separate':
+            return False, True
+        return True, False
+
+    def _expected_keys(self, fields: List[str], include_analysis: bool) -> Tuple[str, ...]:
+        """応答に含まれているべきキー"""
+        keys = ("basic_info",) if fields else ()
+        return keys + (("analysis",) if include_analysis else ())
+
+    def _pick_fields(self, result: Dict, fields: List[str]) -> Dict[str, str]:
+        """LLMの応答から依頼した基本情報の項目だけを取り出す"""
+        basic_info = result.get("basic_info") or {}
+        return {field: basic_info.get(field) for field in fields}
+
+    async def _cached_generate(self, system_prompt: str, raw_text: str,
+                               required: Tuple[str, ...] = ("basic_info",)) -> Dict:
+        """同じモデル・プロンプト・テキストの結果は再利用し、同時に来た同じ依頼は1回の呼び出しにまとめる"""
+        cache = get_llm_cache()
+        key = cache.make_key(self.model_name, system_prompt, raw_text)
+        return await cache.get_or_compute(
+            key,
+            lambda: self._generate(system_prompt, raw_text, required),
+            cacheable=lambda r: "error" not in r,
+        )
+
+    async def _stream_generate(self, system_prompt: str, raw_text: str,
+                               required: Tuple[str, ...] = ("basic_info",)) -> AsyncIterator[Tuple[str, Dict]]:
+        """1回の呼び出しをストリーミングし、basic_info・analysis_partialを順に生成して最後にresultを返す"""
+        cache = get_llm_cache()
+        key = cache.make_key(self.model_name, system_prompt, raw_text)
+        result = cache.get(key)
+        if result is not None:
+            CACHE_REQUESTS.inc(cache='llm', result='hit')
+            yield "result", result
+            return
+        CACHE_REQUESTS.inc(cache='llm', result='miss')
+
+        response_text = ""
+        basic_info_sent = False
+        partial_fields: Dict[str, str] = {}
+        # 途中経過を返している間も含めた、呼び出し全体の時間を記録する
+        with span('llm'):
+            try:
+                response = await self.model.generate_content_async([
+                    {"text": system_prompt},
+                    {"text": f"解析対象テキスト:\n{raw_text}"}
+                ], stream=True)
+                async for chunk in response:
+                    response_text += chunk.text
+                    if not basic_info_sent:
+                        basic_info = _find_complete_object(response_text, "basic_info")
+                        if basic_info is not None:
+                            basic_info_sent = True
+                            yield "basic_info", basic_info
+                    for field, text in _partial_string_fields(response_text, "analysis").items():
+                        if partial_fields.get(field) != text:
+                            partial_fields[field] = text
+                            yield "analysis_partial", {"field": field, "text": text}
+                self._record_usage(response, system_prompt + raw_text, response_text)
+                result = self._parse_response(response_text, required)
+            except Exception as e:
+                print(f"Error: {str(e)}")
+                result = self._generate_error_response(str(e))
+        LLM_CALLS.inc(result='error' if "error" in result else 'success')
+        if "error" not in result:
+            cache.set(key, result)
+        yield "result", result
+
+    def _build_prompt(self, fields: Optional[List[str]] = None, include_analysis: bool = True) -> str:
+        """プロンプトの構築（抽出する基本情報の項目と分析の有無に応じて出力形式を変える）"""
+        if fields is None:
+            fields = list(BASIC_INFO_FIELDS)
+        output_format = {}
+        if fields:
+            output_format["basic_info"] = {field: BASIC_INFO_FIELDS[field] for field in fields}
+        if include_analysis:
+            output_format["analysis"] = dict(ANALYSIS_FIELDS)
+
+        system_prompt = f"""
         以下のテキストから企業情報を抽出し、必ず以下のJSON形式で出力してください。
         テキストが長い場合でも、重要な情報を優先して抽出してください。
         他の文章は一切含めないでください。
 
-        {
-            "basic_info": {
-                "company_name": "会社名を抽出してください",
-                "business_description": "事業内容を抽出してください",
-                "address": "所在地を抽出してください",
-                "representative": "代表者名を抽出してください",
-                "tel": "電話番号を抽出してください",
-                "business_hours": "営業時間を抽出してください"
-            },
-            "analysis": {
-                "summary": "企業の特徴を100文字程度で要約してください",
-                "investor_analysis": "投資家向けの分析を200文字程度で記述してください",
-                "job_seeker_info": "就職活動者向けの情報を200文字程度で記述してください"
-            }
-        }
+        {json.dumps(output_format, ensure_ascii=False, indent=4)}
         """
+        return system_prompt
 
-        try:
-            # テキストが長い場合は分割して処理
-            raw_text = company_data.get('raw_text', '')
-            max_length = 30000  # Geminiの制限に応じて調整
+    async def _prepare_text(self, company_data: Dict) -> str:
+        """解析対象のテキストを用意"""
+        # ページ単位のブロックがあれば、重複を除いて関連度の高いものをトークン予算内で選ぶ
+        text_blocks = company_data.get('text_blocks')
+        if text_blocks:
+            if not self.count_tokens:
+                with span('context_build'):
+                    return self.context_builder.build(text_blocks)
+            # トークン数の確認はGeminiの呼び出しになるため、同じブロックから作った文脈は再利用する
+            # （LLMの応答のキャッシュに当たる場合や、同時に来た同じ依頼でも呼び出さずに済む）
+            cache = get_llm_cache()
+            key = cache.make_key(self.model_name, f"context:{self.context_builder.token_budget}",
+                                 json.dumps(text_blocks, ensure_ascii=False))
+            result = await cache.get_or_compute(key, lambda: self._build_context(text_blocks), label='context')
+            return result["context"]
+        # テキストを抽出できなかった場合
+        return ""
 
-            if len(raw_text) > max_length:
-                raw_text = raw_text[:max_length] + "..."
+    async def _build_context(self, text_blocks: List[Dict[str, str]]) -> Dict[str, str]:
+        """トークン予算内の文脈を作成（キャッシュに保存できるよう辞書で返す）"""
+        with span('context_build'):
+            return {"context": await self.context_builder.build_async(text_blocks, self._count_tokens)}
 
-            response = self.model.generate_content([
-                {"text": system_prompt},
-                {"text": f"解析対象テキスト:\n{raw_text}"}
-            ])
+    async def _count_tokens(self, text: str) -> int:
+        """モデルのトークンカウンターでトークン数を数える"""
+        response = await self.model.count_tokens_async(text)
+        return response.total_tokens
 
-            if response.text:
-                try:
-                    # 余分な文字を削除してJSONのみを抽出
-                    json_text = response.text.strip()
-                    if not json_text.startswith('{'):
-                        json_text = json_text[json_text.find('{'):]
-                    if not json_text.endswith('}'):
-                        json_text = json_text[:json_text.rfind('}')+1]
-                    
-                    result = json.loads(json_text)
-                    # raw_textを確実に含める
-                    result["basic_info"]["raw_text"] = company_data.get("raw_text", "")
-                    return result
-                except json.JSONDecodeError as e:
-                    print(f"JSON Parse Error: {str(e)}\nResponse: {response.text}")
-                    return self._generate_error_response("JSONパースエラー")
-            else:
-                return self._generate_error_response("空の応答")
+    async def _generate(self, system_prompt: str, raw_text: str,
+                        required: Tuple[str, ...] = ("basic_info",)) -> Dict:
+        """Geminiを呼び出して応答のJSONを解析"""
+        try:
+            with span('llm'):
+                response = await self.model.generate_content_async([
+                    {"text": system_prompt},
+                    {"text": f"解析対象テキスト:\n{raw_text}"}
+                ])
+            self._record_usage(response, system_prompt + raw_text, response.text)
+            result = self._parse_response(response.text, required)
 
         except Exception as e:
             print(f"Error: {str(e)}")
-            return self._generate_error_response(str(e))
+            result = self._generate_error_response(str(e))
+        LLM_CALLS.inc(result='error' if "error" in result else 'success')
+        return result
+
+    def _record_usage(self, response, prompt_text: str, response_text: str) -> None:
+        """トークン数を記録（SDKが使用量を返さない場合は概算）"""
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) if usage else 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) if usage else 0
+        LLM_TOKENS.inc(prompt_tokens or self.context_builder.estimate_tokens(prompt_text), kind='prompt')
+        LLM_TOKENS.inc(output_tokens or self.context_builder.estimate_tokens(response_text), kind='output')
+
+    def _parse_response(self, response_text: str, required: Tuple[str, ...] = ("basic_info",)) -> Dict:
+        """応答からJSONを取り出して解析"""
+        if not response_text:
+            return self._generate_error_response("空の応答")
+
+        try:
+            # 余分な文字を削除してJSONのみを抽出
+            json_text = response_text.strip()
+            if not json_text.startswith('{'):
+                json_text = json_text[json_text.find('{'):]
+            if not json_text.endswith('}'):
+                json_text = json_text[:json_text.rfind('}')+1]
+            
+            result = json.loads(json_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON Parse Error: {str(e)}\nResponse: {response_text}")
+            return self._generate_error_response("JSONパースエラー")
+
+        if not isinstance(result, dict):
+            return self._generate_error_response("JSONパースエラー")
+        for key in required:
+            if key not in result:
+                return self._generate_error_response(f"'{key}'")
+        return result
 
     def _generate_error_response(self, error_message: str) -> Dict:
         """エラー時のレスポンスを生成"""
@@ -94,4 +327,74 @@ class LLMProcessor:
                 "investor_analysis": "分析できませんでした",
                 "job_seeker_info": "分析できませんでした"
             }
-        }
\ No newline at end of file
+        }
+
+# 文字列の値（末尾が閉じていない途中の値も含む）を取り出すパターン
+_partial_string_pattern = re.compile(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
+def _find_complete_object(text: str, key: str) -> Optional[Dict]:
+    """生成途中のJSONから、指定キーのオブジェクトが閉じていれば解析して返す"""
+    key_pos = text.find(f'"{key}"')
+    if key_pos < 0:
+        return None
+    start = text.find('{', key_pos)
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(text[start:pos + 1])
+                except json.JSONDecodeError:
+                    return None
+    return None
+
+
+def _partial_string_fields(text: str, key: str) -> Dict[str, str]:
+    """生成途中のJSONから、指定キーのオブジェクト内の文字列の値を途中まで取り出す"""
+    key_pos = text.find(f'"{key}"')
+    if key_pos < 0:
+        return {}
+    start = text.find('{', key_pos)
+    if start < 0:
+        return {}
+
+    fields = {}
+    for match in _partial_string_pattern.finditer(text, start):
+        try:
+            fields[match.group(1)] = json.loads(f'"{match.group(2)}"', strict=False)
+        except json.JSONDecodeError:
+            # \uXXXXの途中などで切れている場合は次のチャンクを待つ
+            continue
+    return fields
+
+
+_processor: Optional[LLMProcessor] = None
+_processor_lock = threading.Lock()
+
+
+def get_llm_processor() -> LLMProcessor:
+    """プロセス共有のLLMProcessorを取得（APIキーの設定とモデルの作成は1回だけ行う）"""
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            _processor = LLMProcessor()
+        return _processor
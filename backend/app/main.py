@@ -1,15 +1,76 @@
 from fastapi import FastAPI, HTTPException # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
+from fastapi.middleware.gzip import GZipMiddleware # type: ignore
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse # type: ignore
 from pydantic import BaseModel, HttpUrl # type: ignore
-from typing import Optional, Dict
-from .scraper import CompanyScraper
-from .llm_processor import LLMProcessor
+from typing import AsyncIterator, Optional, Dict, List
+from urllib.parse import urlparse
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .pipeline import analyze_company, apply_raw_text_option, build_error_response, stream_company_events
+from .admission import AdmissionController, HostLimiter, OverloadedError
+from .jobs import get_job_store, close_job_store
+from .company_store import get_company_store
+from .lifecycle import warm_up, shutdown
+from .metrics import IN_FLIGHT, render_metrics
 import traceback  # 追加
+import asyncio
+import json
+import os
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    # orjsonがない環境では標準のjsonを使う
+    orjson = None
+
+def dumps_json(data) -> str:
+    """JSONの文字列に変換（orjsonがあれば使う）"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False)
+
+class FastJSONResponse(JSONResponse):
+    """orjsonがあれば使うJSONレスポンス"""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return super().render(content)
+
+# スクレイピング（同期処理）はイベントループを止めないよう専用のスレッドで実行
+scrape_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SCRAPE_WORKERS', '4')),
+    thread_name_prefix='scrape',
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時に共有コンポーネントを作成し、終了時に閉じる"""
+    # Chromeの起動などで待たされないよう、受け付けを始める前に済ませる
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, warm_up)
+    try:
+        yield
+    finally:
+        shutdown()
+        close_job_store()
+        scrape_executor.shutdown(wait=False, cancel_futures=True)
+        batch_executor.shutdown(wait=False, cancel_futures=True)
 
 app = FastAPI(
     title="Company Scraper API",
     description="企業Webサイトから情報を抽出するAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+# 大きなレスポンス（一括処理の結果など）はgzipで圧縮する（SSEは圧縮しない）
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(os.getenv('GZIP_MIN_SIZE', '1000')),
+    compresslevel=int(os.getenv('GZIP_LEVEL', '5')),
 )
 
 # CORS設定を修正
@@ -28,9 +89,35 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# 同時に処理するリクエスト数の制限と待ち行列
+admission = AdmissionController()
+
+# 一括処理の全体・ホストごとの同時実行数
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', '10000'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', os.getenv('SCRAPE_WORKERS', '4')))
+batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+# 一括処理は専用のスレッドで実行し、受け付け済みの/api/scrapeのリクエストを待たせない
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+host_limiter = HostLimiter()
+
 # リクエストモデル
 class ScrapeRequest(BaseModel):
     url: str
+    # Trueにすると処理段階ごとの所要時間をレスポンスのtimingsに含める
+    timings: bool = False
+    # Trueにするとページの内容が前回と同じでもLLMで処理し直す
+    force: bool = False
+    # Trueにすると抽出したテキスト全体をbasic_info.raw_textに含める
+    raw_text: bool = False
+
+class BatchScrapeRequest(BaseModel):
+    urls: List[str]
+    # Falseにすると基本情報だけを取得する（分析のLLM呼び出しを省略）
+    analysis: bool = True
+    # Trueにするとページの内容が前回と同じでもLLMで処理し直す
+    force: bool = False
+    # Trueにすると抽出したテキスト全体をbasic_info.raw_textに含める
+    raw_text: bool = False
 
 # レスポンスモデル
 class ScrapeResponse(BaseModel):
@@ -48,79 +135,153 @@ class ScrapeResponse(BaseModel):
 @app.post("/api/scrape")
 async def scrape_company(request: ScrapeRequest):
     try:
-        # スクレイパーのインスタンス化
-        scraper = CompanyScraper()
-        
-        # スクレイピングの実行
-        scraped_data = scraper.scrape(request.url)
-        
-        # LLMプロセッサーのインスタンス化
-        llm_processor = LLMProcessor()
-        
-        try:
-            # LLMでの分析
-            result = await llm_processor.process_company_info(scraped_data)
-            
-            # エラーチェック
-            if "error" in result:
-                return result
-
-            # レスポンスの構築
-            return {
-                "message": "Success",
-                "basic_info": result["basic_info"],
-                "analysis": result["analysis"]
-            }
-
-        except Exception as llm_error:
-            print(f"LLM Error: {str(llm_error)}")
-            print(f"LLM Error Traceback: {traceback.format_exc()}")
-            return {
-                "message": "Error",
-                "error": f"LLM処理中にエラーが発生しました: {str(llm_error)}",
-                "basic_info": {
-                    "company_name": "取得できませんでした",
-                    "business_description": "取得できませんでした",
-                    "address": "取得できませんでした",
-                    "representative": "取得できませんでした",
-                    "tel": "取得できませんでした",
-                    "business_hours": "取得できませんでした",
-                    "raw_text": scraped_data.get("raw_text", "")
-                },
-                "analysis": {
-                    "summary": "分析できませんでした",
-                    "investor_analysis": "分析できませんでした",
-                    "job_seeker_info": "分析できませんでした"
-                }
-            }
-
+        async with admission.slot():
+            result = await analyze_company(request.url, scrape_executor, include_timings=request.timings,
+                                           force=request.force, include_raw_text=request.raw_text)
+        # 結果は文字列と数値だけなので、jsonable_encoderを通さずにそのまま返す
+        return FastJSONResponse(result)
     except ValueError as e:
         error_detail = str(e)
         print(f"Validation Error: {error_detail}")
         print(f"Validation Error Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=400, detail=error_detail)
-    except Exception as e:
-        error_detail = str(e)
-        print(f"Server Error: {error_detail}")
-        print(f"Error Traceback: {traceback.format_exc()}")
-        return {
-            "message": "Error",
-            "error": f"処理に失敗しました: {error_detail}",
-            "basic_info": {
-                "company_name": "取得できませんでした",
-                "business_description": "取得できませんでした",
-                "address": "取得できませんでした",
-                "representative": "取得できませんでした",
-                "tel": "取得できませんでした",
-                "business_hours": "取得できませんでした",
-                "raw_text": ""
-            },
-            "analysis": {
-                "summary": "分析できませんでした",
-                "investor_analysis": "分析できませんでした",
-                "job_seeker_info": "分析できませんでした"
-            }
-        }
+    except OverloadedError as e:
+        print(f"Overloaded: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+@app.get("/api/scrape/stream")
+async def scrape_company_stream(url: str, timings: bool = False, force: bool = False, raw_text: bool = False):
+    """スクレイピングとLLM分析の途中経過をServer-Sent Eventsで返す"""
+    if admission.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="混雑しているため受け付けられませんでした",
+            headers={"Retry-After": str(admission.retry_after)},
+        )
+    return StreamingResponse(
+        stream_sse(url, timings, force, raw_text),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def stream_sse(url: str, include_timings: bool = False, force: bool = False,
+                     include_raw_text: bool = False) -> AsyncIterator[str]:
+    """処理の各段階をSSEのイベントとして生成"""
+    try:
+        async with admission.slot():
+            async for name, data in stream_company_events(url, scrape_executor, include_timings, force,
+                                                          include_raw_text):
+                yield format_sse(name, data)
+    except OverloadedError as e:
+        print(f"Overloaded: {str(e)}")
+        yield format_sse("error", {**build_error_response(str(e)), "retry_after": e.retry_after})
+
+def format_sse(event: str, data: Dict) -> str:
+    """SSEの1イベント分の文字列を作成"""
+    return f"event: {event}\ndata: {dumps_json(data)}\n\n"
+
+@app.post("/api/scrape/batch")
+async def scrape_batch(request: BatchScrapeRequest):
+    """複数URLを処理し、完了した順にNDJSONで1行ずつ返す"""
+    if len(request.urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"URLは最大{BATCH_MAX_URLS}件までです")
+    return StreamingResponse(stream_batch(request.urls, request.analysis, request.force, request.raw_text),
+                             media_type="application/x-ndjson")
+
+async def stream_batch(urls: List[str], include_analysis: bool = True, force: bool = False,
+                       include_raw_text: bool = False) -> AsyncIterator[str]:
+    """各URLの結果を完了順にNDJSONの行として生成"""
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def process(index: int, url: str):
+        try:
+            # 同じホストへの集中を避けてから全体の枠を確保する
+            async with host_limiter.slot(urlparse(url).netloc.lower()):
+                async with batch_slots:
+                    result = await analyze_company(url, batch_executor, include_analysis, force=force,
+                                                   include_raw_text=include_raw_text)
+        except ValueError as e:
+            print(f"Validation Error ({url}): {str(e)}")
+            result = build_error_response(str(e))
+        except Exception as e:
+            print(f"Batch Error ({url}): {str(e)}")
+            result = build_error_response(f"処理に失敗しました: {str(e)}")
+        await results.put({"index": index, "url": url, **apply_raw_text_option(result, include_raw_text)})
+
+    tasks = [asyncio.create_task(process(i, url)) for i, url in enumerate(urls)]
+    try:
+        for _ in tasks:
+            item = await results.get()
+            yield dumps_json(item) + "\n"
+    finally:
+        # クライアントが切断した場合は残りの処理を止める
+        for task in tasks:
+            task.cancel()
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: ScrapeRequest):
+    """スクレイピングをジョブとして登録（結果は /api/jobs/{job_id} で取得）"""
+    loop = asyncio.get_running_loop()
+    options = {"timings": request.timings, "force": request.force, "raw_text": request.raw_text}
+    job = await loop.run_in_executor(None, get_job_store().submit, request.url, options)
+    return format_job(job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """ジョブの状態と結果を取得"""
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return format_job(job)
+
+def format_job(job: Dict) -> Dict:
+    """ジョブをレスポンス用の形式に変換"""
+    return {
+        "job_id": job["id"],
+        "url": job["url"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "error": job["error"],
+        "options": job["options"],
+        "result": job["result"],
+    }
+
+@app.get("/api/companies/changed")
+async def list_changed_companies(since: float, limit: int = 100):
+    """指定時刻（UNIX時間）以降にページの内容が変わった企業を変更の古い順に返す"""
+    store = get_company_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="企業ストアが無効になっています")
+    loop = asyncio.get_running_loop()
+    companies = await loop.run_in_executor(None, store.changed_since, since, max(1, min(limit, 1000)))
+    return {"companies": [format_company(company) for company in companies]}
+
+def format_company(company: Dict) -> Dict:
+    """保存済みの企業をレスポンス用の形式に変換"""
+    return {
+        "url": company["url"],
+        "content_hash": company["content_hash"],
+        "first_seen_at": company["first_seen_at"],
+        "checked_at": company["checked_at"],
+        "changed_at": company["changed_at"],
+        "changed_pages": company["changed_pages"],
+        "basic_info": company["result"]["basic_info"],
+        "analysis": company["result"]["analysis"],
+    }
+
+@app.get("/api/metrics")
+async def metrics():
+    """処理段階ごとの所要時間や件数をPrometheusのテキスト形式で返す（複数ワーカーでは応答したプロセスの値のみ）"""
+    IN_FLIGHT.set(admission.active, state='active')
+    IN_FLIGHT.set(admission.waiting, state='waiting')
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import threading
+import time
+
+# 所要時間のヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """ラベルごとの値を持つメトリクスの基底クラス"""
+
+    kind = ''
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """増え続ける値（件数・トークン数など）"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(self.values().items())]
+
+
+class Gauge(_Metric):
+    """増減する現在値（実行中のリクエスト数など）"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """値の分布（所要時間など）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # ラベルごとに（バケットごとの件数, 合計, 件数）
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('scraper_stage_seconds', '処理段階ごとの所要時間（秒）', ['stage'])
+REQUESTS = Counter('scraper_requests_total', '処理したリクエスト数', ['result'])
+PAGES = Counter('scraper_pages_total', '取得方式ごとの処理ページ数', ['tier'])
+PAGES_PER_REQUEST = Histogram('scraper_pages_per_request', '1リクエストで処理したページ数', [],
+                              buckets=(1, 2, 3, 4, 5, 6, 8, 10, 20))
+BROWSER_FALLBACKS = Counter('scraper_browser_fallbacks_total', '静的取得からブラウザに切り替えた回数', ['reason'])
+CACHE_REQUESTS = Counter('scraper_cache_requests_total', 'キャッシュの参照結果', ['cache', 'result'])
+LLM_CALLS = Counter('scraper_llm_calls_total', 'LLMの呼び出し回数', ['result'])
+LLM_TOKENS = Counter('scraper_llm_tokens_total', 'LLMのトークン数', ['kind'])
+PAGE_TRUNCATIONS = Counter('scraper_page_truncations_total', 'HTMLが上限を超えたため切り詰めたページ数', ['tier'])
+HOST_CIRCUIT = Counter('scraper_host_circuit_total', 'ホストごとのサーキットブレーカーの動作', ['event'])
+IN_FLIGHT = Gauge('scraper_in_flight_requests', '実行中・待機中のリクエスト数', ['state'])
+
+REGISTRY: List[_Metric] = [
+    STAGE_SECONDS, REQUESTS, PAGES, PAGES_PER_REQUEST, BROWSER_FALLBACKS,
+    CACHE_REQUESTS, LLM_CALLS, LLM_TOKENS, PAGE_TRUNCATIONS, HOST_CIRCUIT, IN_FLIGHT,
+]
+
+
+def render_metrics() -> str:
+    """Prometheusのテキスト形式でメトリクスを出力"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+class Timings:
+    """1リクエスト分の処理段階ごとの所要時間"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += seconds
+            entry['count'] += 1
+
+    def as_dict(self) -> Dict:
+        """レスポンスに含める形式（並行して処理した段階は合計が全体を超えることがある）"""
+        with self._lock:
+            stages = {stage: {'seconds': round(entry['seconds'], 4), 'count': int(entry['count'])}
+                      for stage, entry in self._stages.items()}
+        return {'total_seconds': round(time.perf_counter() - self._started, 4), 'stages': stages}
+
+
+# 処理中のリクエストの所要時間の記録先（スレッドに渡す場合はcontextvars.copy_contextを使う）
+_current_timings: ContextVar[Optional[Timings]] = ContextVar('current_timings', default=None)
+
+
+@contextmanager
+def track_request() -> Iterator[Timings]:
+    """このブロック内で計測した段階をリクエスト単位でも記録する"""
+    timings = Timings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """処理段階の所要時間を計測してヒストグラムと実行中のリクエストに記録"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
@@ -0,0 +1,207 @@
+from typing import Dict, List, Optional
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+class CachedPage:
+    """キャッシュされたページ"""
+
+    def __init__(self, url: str, html: str, texts: List[str], tier: str, etag: Optional[str],
+                 last_modified: Optional[str], fetched_at: float, ttl: float,
+                 extracted: Optional[Dict] = None):
+        self.url = url
+        self.html = html
+        self.texts = texts
+        # 取得時に抽出した基本情報・確信度・リンク（古いエントリにはない）
+        self.extracted = extracted
+        self.tier = tier
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+
+    @property
+    def is_fresh(self) -> bool:
+        """TTL内かどうか"""
+        return time.time() - self.fetched_at < self.ttl
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """条件付きリクエスト用のヘッダー"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """HTMLと抽出済みテキスト・基本情報・リンクをディスクに保存するページキャッシュ
+
+    HTML本体は内容のハッシュをファイル名にして保存し（同じ内容は1つにまとまる）、
+    URLごとのメタデータはSQLiteで管理する。合計サイズが上限を超えたら
+    最後に参照された時刻が古いものから削除する。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or os.getenv('PAGE_CACHE_DIR', '.cache/pages')
+        self.ttl = ttl if ttl is not None else float(os.getenv('PAGE_CACHE_TTL', '86400'))
+        self.max_bytes = max_bytes or int(float(os.getenv('PAGE_CACHE_MAX_MB', '500')) * 1024 * 1024)
+        self.blob_dir = os.path.join(self.cache_dir, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.db'),
+                                     check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                texts TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+        # 抽出結果の列がない古いキャッシュには列を追加する
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(pages)')}
+        if 'extracted' not in columns:
+            self._conn.execute('ALTER TABLE pages ADD COLUMN extracted TEXT')
+        self._conn.commit()
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """URLのキャッシュを取得（期限切れでも返すので呼び出し側で再検証する）"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content_hash, texts, tier, etag, last_modified, fetched_at, extracted FROM pages WHERE url = ?',
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self._conn.commit()
+
+        content_hash, texts, tier, etag, last_modified, fetched_at, extracted = row
+        try:
+            with open(self._blob_path(content_hash), 'r', encoding='utf-8') as f:
+                html = f.read()
+        except OSError:
+            # 本体が消えている場合はキャッシュなしとして扱う
+            self.delete(url)
+            return None
+        return CachedPage(url, html, json.loads(texts), tier, etag, last_modified, fetched_at, self.ttl,
+                          json.loads(extracted) if extracted else None)
+
+    def put(self, url: str, html: str, texts: List[str], tier: str,
+            etag: Optional[str] = None, last_modified: Optional[str] = None,
+            extracted: Optional[Dict] = None) -> None:
+        """ページを保存（extractedは基本情報・確信度・リンクなど、キャッシュから返す際に解析を省く抽出結果）"""
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        texts_json = json.dumps(texts, ensure_ascii=False)
+        extracted_json = json.dumps(extracted, ensure_ascii=False) if extracted is not None else None
+        size = len(data) + len(texts_json.encode('utf-8')) + len((extracted_json or '').encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (url, content_hash, texts, tier, etag, last_modified, size, '
+                'fetched_at, accessed_at, extracted) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, content_hash, texts_json, tier, etag, last_modified, size, now, now, extracted_json)
+            )
+            self._conn.commit()
+            if previous and previous[0] != content_hash:
+                self._remove_unreferenced_blob(previous[0])
+            self._evict()
+
+    def touch(self, url: str) -> None:
+        """再検証で変更がなかったページの取得時刻を更新"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            self._conn.commit()
+
+    def delete(self, url: str) -> None:
+        """ページをキャッシュから削除"""
+        with self._lock:
+            row = self._conn.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+            self._conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self._conn.commit()
+            if row:
+                self._remove_unreferenced_blob(row[0])
+
+    def _remove_unreferenced_blob(self, content_hash: str) -> None:
+        """どのURLからも参照されなくなったHTML本体を削除"""
+        in_use = self._conn.execute('SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1', (content_hash,)).fetchone()
+        if not in_use:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えていれば古いものから削除（ロック取得済みで呼ぶ）"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT url, content_hash, size FROM pages ORDER BY accessed_at').fetchall()
+        evicted = []
+        for url, content_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            evicted.append(content_hash)
+            total -= size
+        self._conn.commit()
+        for content_hash in set(evicted):
+            self._remove_unreferenced_blob(content_hash)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[PageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """プロセス共有のページキャッシュを取得（無効化されている場合はNone）"""
+    global _cache
+    if os.getenv('PAGE_CACHE_ENABLED', '1') == '0':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
+
+
+def close_page_cache() -> None:
+    """プロセス共有のページキャッシュを閉じる"""
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,130 @@
+from typing import Dict, Optional
+from urllib.parse import urlparse
+from selenium.common.exceptions import WebDriverException  # type: ignore
+from .browser_profile import get_profile_name
+import threading
+import time
+import os
+
+# 読み込み状態・リソース数・最後のDOM変更時刻をまとめて取得するスクリプト
+_READINESS_SCRIPT = """
+if (!window.__scraperWait) {
+    window.__scraperWait = {last: performance.now()};
+    new MutationObserver(function () {
+        window.__scraperWait.last = performance.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return {
+    ready: document.readyState,
+    resources: performance.getEntriesByType('resource').length,
+    now: performance.now(),
+    last_mutation: window.__scraperWait.last
+};
+"""
+
+
+class _DomainStats:
+    """ドメインごとの待機時間の統計"""
+
+    def __init__(self):
+        self.visits = 0
+        self.settle_avg = 0.0  # 指数移動平均（秒）
+        self.timeouts = 0
+
+
+class PageWaiter:
+    """ページの準備完了を検知して待機するクラス"""
+
+    def __init__(self, max_wait: Optional[float] = None, min_wait: Optional[float] = None,
+                 quiet_window: Optional[float] = None, poll_interval: float = 0.1):
+        # 待機の上限（秒）
+        self.max_wait = max_wait or float(os.getenv('PAGE_WAIT_MAX_SECONDS', '10'))
+        # 調整後の待機予算の下限（秒）
+        self.min_wait = min_wait or float(os.getenv('PAGE_WAIT_MIN_SECONDS', '1'))
+        # DOM変更・通信が止まってから準備完了とみなすまでの時間（秒）
+        self.quiet_window = quiet_window or float(os.getenv('PAGE_WAIT_QUIET_SECONDS', '0.5'))
+        self.poll_interval = poll_interval
+        self.smoothing = 0.3
+        # 待機を終えてよいdocument.readyState（eagerではサブリソースの読み込み完了を待たない）
+        eager = os.getenv('BROWSER_PAGE_LOAD_STRATEGY', 'eager') == 'eager' and get_profile_name() == 'lean'
+        self.ready_states = ('interactive', 'complete') if eager else ('complete',)
+
+        self._stats: Dict[str, _DomainStats] = {}
+        self._lock = threading.Lock()
+
+    def budget_for(self, url: str) -> float:
+        """ドメインの過去の待機時間から今回の待機予算を決める"""
+        with self._lock:
+            stats = self._stats.get(urlparse(url).netloc)
+            if stats is None or stats.visits == 0:
+                return self.max_wait
+            budget = stats.settle_avg * 1.5 + self.quiet_window
+        return min(self.max_wait, max(self.min_wait, budget))
+
+    def _record(self, url: str, settle_time: float, timed_out: bool) -> None:
+        """待機結果をドメインの統計に反映"""
+        domain = urlparse(url).netloc
+        with self._lock:
+            stats = self._stats.setdefault(domain, _DomainStats())
+            if stats.visits == 0:
+                stats.settle_avg = settle_time
+            else:
+                stats.settle_avg += self.smoothing * (settle_time - stats.settle_avg)
+            stats.visits += 1
+            if timed_out:
+                stats.timeouts += 1
+
+    def wait(self, driver, url: str) -> float:
+        """driver.get後、ページが落ち着くまで待機して待機時間を返す"""
+        budget = self.budget_for(url)
+        start = time.monotonic()
+        deadline = start + budget
+        complete_at = None
+        last_resources = -1
+        resources_changed_at = start
+
+        while True:
+            now = time.monotonic()
+            try:
+                state = driver.execute_script(_READINESS_SCRIPT)
+            except WebDriverException as e:
+                print(f"Page wait error ({url}): {str(e)}")
+                break
+
+            if state['resources'] != last_resources:
+                last_resources = state['resources']
+                resources_changed_at = now
+
+            if state['ready'] in self.ready_states:
+                if complete_at is None:
+                    complete_at = now
+                mutation_quiet = (state['now'] - state['last_mutation']) / 1000 >= self.quiet_window
+                network_quiet = now - resources_changed_at >= self.quiet_window
+                if mutation_quiet and network_quiet:
+                    elapsed = now - start
+                    self._record(url, elapsed, timed_out=False)
+                    return elapsed
+
+            if now >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        # 上限に達した場合は読み込み完了までの時間を統計に使う
+        # （常にDOMが変化し続けるサイトで毎回上限まで待たないようにする）
+        elapsed = time.monotonic() - start
+        settle_time = (complete_at - start) if complete_at is not None else elapsed
+        self._record(url, settle_time, timed_out=True)
+        return elapsed
+
+
+_waiter: Optional[PageWaiter] = None
+_waiter_lock = threading.Lock()
+
+
+def get_page_waiter() -> PageWaiter:
+    """プロセス共有のPageWaiterを取得"""
+    global _waiter
+    with _waiter_lock:
+        if _waiter is None:
+            _waiter = PageWaiter()
+        return _waiter
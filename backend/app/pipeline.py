@@ -0,0 +1,277 @@
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from concurrent.futures import Executor
+from .scraper import CompanyScraper
+from .llm_processor import get_llm_processor
+from .metrics import span, track_request, REQUESTS, STAGE_SECONDS
+from .company_store import get_company_store
+from .text_blocks import join_text_blocks
+import contextvars
+import traceback
+import asyncio
+import time
+import os
+
+# レスポンスに含めるraw_textの最大文字数
+RAW_TEXT_MAX_CHARS = int(os.getenv('RAW_TEXT_MAX_CHARS', '50000'))
+
+
+def run_scrape(url: str, on_event: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """スクレイピングを実行（スレッドプールで呼ばれる）"""
+    # スクレイパーのインスタンス化
+    scraper = CompanyScraper()
+    # スクレイピングの実行
+    with span('scrape'):
+        return scraper.scrape(url, on_event)
+
+
+def _run_in_executor(loop: asyncio.AbstractEventLoop, executor: Optional[Executor], *args) -> asyncio.Future:
+    """呼び出し元のコンテキスト（処理時間の記録先など）を引き継いでスレッドで実行"""
+    return loop.run_in_executor(executor, contextvars.copy_context().run, *args)
+
+
+def build_raw_text(scraped_data: Dict, include_raw_text: bool) -> Optional[str]:
+    """レスポンスに含めるraw_text（要求された場合だけテキストブロックからRAW_TEXT_MAX_CHARS分まで作る）"""
+    if not include_raw_text:
+        return None
+    return join_text_blocks(scraped_data.get("text_blocks") or [], RAW_TEXT_MAX_CHARS)
+
+
+def build_error_response(error: str, raw_text: Optional[str] = "") -> Dict:
+    """処理に失敗した場合のレスポンスを生成"""
+    return {
+        "message": "Error",
+        "error": error,
+        "basic_info": {
+            "company_name": "取得できませんでした",
+            "business_description": "取得できませんでした",
+            "address": "取得できませんでした",
+            "representative": "取得できませんでした",
+            "tel": "取得できませんでした",
+            "business_hours": "取得できませんでした",
+            "raw_text": raw_text
+        },
+        "analysis": {
+            "summary": "分析できませんでした",
+            "investor_analysis": "分析できませんでした",
+            "job_seeker_info": "分析できませんでした"
+        }
+    }
+
+
+def find_unchanged(url: str, scraped_data: Dict, include_analysis: bool,
+                   include_raw_text: bool = False) -> Optional[Dict]:
+    """ページの内容が前回と同じ企業の保存済みの結果をレスポンスの形式で返す（なければNone）"""
+    store = get_company_store()
+    if store is None:
+        return None
+    try:
+        company = store.find_unchanged(url, scraped_data.get("page_hashes") or {}, include_analysis)
+    except Exception as e:
+        print(f"Company store error ({url}): {str(e)}")
+        return None
+    if company is None:
+        return None
+    basic_info = dict(company["result"]["basic_info"])
+    basic_info["raw_text"] = build_raw_text(scraped_data, include_raw_text)
+    return {
+        "message": "Success",
+        "basic_info": basic_info,
+        "analysis": company["result"]["analysis"],
+        "changed": False,
+    }
+
+
+def save_result(url: str, scraped_data: Dict, result: Dict, include_analysis: bool) -> Optional[bool]:
+    """処理結果を保存して前回から内容が変わったかを返す（ストアが無効・失敗した場合はNone）"""
+    store = get_company_store()
+    if store is None:
+        return None
+    # raw_textは毎回取得し直すので保存しない
+    basic_info = {key: value for key, value in result["basic_info"].items() if key != "raw_text"}
+    try:
+        return store.save(url, scraped_data.get("page_hashes") or {},
+                          {"basic_info": basic_info, "analysis": result["analysis"]}, include_analysis)
+    except Exception as e:
+        print(f"Company store error ({url}): {str(e)}")
+        return None
+
+
+def apply_raw_text_option(result: Dict, include_raw_text: bool) -> Dict:
+    """raw_textは要求された場合だけ（RAW_TEXT_MAX_CHARSまで）レスポンスに含める"""
+    basic_info = result.get("basic_info")
+    if not isinstance(basic_info, dict) or "raw_text" not in basic_info:
+        return result
+    raw_text = basic_info["raw_text"] or ""
+    if not include_raw_text:
+        basic_info["raw_text"] = None
+    elif len(raw_text) > RAW_TEXT_MAX_CHARS:
+        basic_info["raw_text"] = raw_text[:RAW_TEXT_MAX_CHARS]
+        result["raw_text_truncated"] = True
+    return result
+
+
+async def analyze_company(url: str, executor: Optional[Executor] = None, include_analysis: bool = True,
+                          include_timings: bool = False, force: bool = False,
+                          include_raw_text: bool = False) -> Dict:
+    """スクレイピングとLLM分析を実行（URLが不正な場合はValueError）
+
+    include_analysisがFalseの場合は基本情報だけを取得し、分析は行わない。
+    include_timingsがTrueの場合は処理段階ごとの所要時間をtimingsに含める。
+    ページの内容が前回と同じ企業はLLMを呼ばずに保存済みの結果を返す（forceがTrueなら常に処理する）。
+    抽出したテキスト全体（raw_text）はinclude_raw_textがTrueの場合だけ含める。
+    """
+    with track_request() as timings:
+        try:
+            with span('total'):
+                result = await _analyze_company(url, executor, include_analysis, force, include_raw_text)
+        except ValueError:
+            REQUESTS.inc(result='invalid')
+            raise
+    REQUESTS.inc(result='error' if "error" in result else 'success')
+    apply_raw_text_option(result, include_raw_text)
+    if include_timings:
+        result["timings"] = timings.as_dict()
+    return result
+
+
+async def _analyze_company(url: str, executor: Optional[Executor], include_analysis: bool, force: bool,
+                           include_raw_text: bool) -> Dict:
+    try:
+        # スクレイピングの実行
+        loop = asyncio.get_running_loop()
+        scraped_data = await _run_in_executor(loop, executor, run_scrape, url)
+
+        # 前回から内容が変わっていなければ保存済みの結果を返す
+        if not force:
+            stored = await _run_in_executor(loop, None, find_unchanged, url, scraped_data, include_analysis,
+                                            include_raw_text)
+            if stored is not None:
+                return stored
+        
+        # LLMプロセッサー（プロセスで共有）
+        llm_processor = get_llm_processor()
+        
+        try:
+            # LLMでの分析
+            result = await llm_processor.process_company_info(scraped_data, include_analysis)
+            
+            # エラーチェック
+            if "error" in result:
+                return result
+
+            # レスポンスの構築
+            response = {
+                "message": "Success",
+                "basic_info": {**result["basic_info"], "raw_text": build_raw_text(scraped_data, include_raw_text)},
+                "analysis": result["analysis"]
+            }
+            changed = await _run_in_executor(loop, None, save_result, url, scraped_data, result, include_analysis)
+            if changed is not None:
+                response["changed"] = changed
+            return response
+
+        except Exception as llm_error:
+            print(f"LLM Error: {str(llm_error)}")
+            print(f"LLM Error Traceback: {traceback.format_exc()}")
+            return build_error_response(
+                f"LLM処理中にエラーが発生しました: {str(llm_error)}",
+                build_raw_text(scraped_data, include_raw_text)
+            )
+
+    except ValueError:
+        raise
+    except Exception as e:
+        error_detail = str(e)
+        print(f"Server Error: {error_detail}")
+        print(f"Error Traceback: {traceback.format_exc()}")
+        return build_error_response(f"処理に失敗しました: {error_detail}")
+
+
+async def stream_company_events(url: str, executor: Optional[Executor] = None, include_timings: bool = False,
+                                force: bool = False, include_raw_text: bool = False) -> AsyncIterator[Tuple[str, Dict]]:
+    """スクレイピングとLLM分析の途中経過をイベントとして順に生成
+
+    main_page → related_page（ページごと）→ basic_info → analysis_partial → analysis
+    → done の順に生成し、失敗した場合はerrorで終わる。
+    include_timingsがTrueの場合は最後のイベントに処理段階ごとの所要時間を含める。
+    raw_textはinclude_raw_textがTrueの場合だけ最後のイベントに含める。
+    """
+    with track_request() as timings:
+        started = time.perf_counter()
+        async for name, data in _stream_company_events(url, executor, force, include_raw_text):
+            if name in ("done", "error"):
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
+                REQUESTS.inc(result='success' if name == "done" else 'error')
+                apply_raw_text_option(data, include_raw_text)
+                if include_timings:
+                    data = {**data, "timings": timings.as_dict()}
+            yield name, data
+
+
+async def _stream_company_events(url: str, executor: Optional[Executor], force: bool,
+                                 include_raw_text: bool) -> AsyncIterator[Tuple[str, Dict]]:
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(name: str, data: Dict) -> None:
+        # スクレイピングのスレッドからイベントループへ渡す
+        loop.call_soon_threadsafe(events.put_nowait, (name, data))
+
+    scrape_future = _run_in_executor(loop, executor, run_scrape, url, on_event)
+    while True:
+        next_event = asyncio.ensure_future(events.get())
+        done, _ = await asyncio.wait({next_event, scrape_future}, return_when=asyncio.FIRST_COMPLETED)
+        if next_event in done:
+            yield next_event.result()
+            continue
+        next_event.cancel()
+        break
+    while not events.empty():
+        yield events.get_nowait()
+
+    try:
+        scraped_data = scrape_future.result()
+    except ValueError as e:
+        print(f"Validation Error: {str(e)}")
+        yield "error", build_error_response(str(e))
+        return
+    except Exception as e:
+        print(f"Server Error: {str(e)}")
+        print(f"Error Traceback: {traceback.format_exc()}")
+        yield "error", build_error_response(f"処理に失敗しました: {str(e)}")
+        return
+
+    # 前回から内容が変わっていなければ保存済みの結果を返す
+    if not force:
+        stored = await _run_in_executor(loop, None, find_unchanged, url, scraped_data, True, include_raw_text)
+        if stored is not None:
+            yield "basic_info", {k: v for k, v in stored["basic_info"].items() if k != "raw_text"}
+            yield "analysis", stored["analysis"]
+            yield "done", stored
+            return
+
+    try:
+        llm_processor = get_llm_processor()
+        async for name, data in llm_processor.stream_company_info(scraped_data):
+            if name != "result":
+                yield name, data
+                continue
+            if "error" in data:
+                yield "error", data
+            else:
+                response = {
+                    "message": "Success",
+                    "basic_info": {**data["basic_info"], "raw_text": build_raw_text(scraped_data, include_raw_text)},
+                    "analysis": data["analysis"]
+                }
+                changed = await _run_in_executor(loop, None, save_result, url, scraped_data, data, True)
+                if changed is not None:
+                    response["changed"] = changed
+                yield "done", response
+    except Exception as llm_error:
+        print(f"LLM Error: {str(llm_error)}")
+        print(f"LLM Error Traceback: {traceback.format_exc()}")
+        yield "error", build_error_response(
+            f"LLM処理中にエラーが発生しました: {str(llm_error)}",
+            build_raw_text(scraped_data, include_raw_text)
+        )
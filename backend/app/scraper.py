@@ -1,183 +1,593 @@
-from bs4 import BeautifulSoup, Comment  # type: ignore
-import requests # type: ignore
-from typing import Dict, Optional
+from bs4 import BeautifulSoup, Comment, FeatureNotFound  # type: ignore
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import re
-import chardet  # type: ignore
-from selenium import webdriver  # type: ignore
-from selenium.webdriver.chrome.service import Service  # type: ignore
+import math
 from selenium.webdriver.chrome.options import Options  # type: ignore
+from .browser_pool import get_browser_pool
+from .browser_profile import get_chrome_options, resolve_chrome_driver_path
+from .page_wait import get_page_waiter
+from .fetcher import get_http_client, fetch_limited, get_max_page_bytes, decode_html, record_tier, get_tier_counts
+from .label_index import LabelIndex
+from .text_blocks import iter_text_blocks
+from .page_cache import CachedPage, get_page_cache
+from .metrics import span, PAGES_PER_REQUEST, BROWSER_FALLBACKS, CACHE_REQUESTS, PAGE_TRUNCATIONS
+from .host_scheduler import HostUnavailableError, get_host_scheduler
+from .frontier import CrawlFrontier, parse_sitemap
+from .company_store import hash_texts
+import contextvars
 import time
 import os
 
+# リクエストヘッダー（プロセス共有のHTTPクライアントにも使う）
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+    'Accept-Encoding': 'gzip, deflate, br',
+}
+
+# robots.txtの読み込みの上限（Googleと同じく500KiBを超える分は無視する）
+ROBOTS_MAX_BYTES = 500 * 1024
+
+# 郵便番号（〒付き、または前後が数字・ハイフンでなく都道府県・市区町村が続くもの）
+_POSTAL_CODE = (r'(?:〒\s*\d{3}[-−]\d{4}'
+                r'|(?<![\d\-−])\d{3}[-−]\d{4}(?![\d\-−])(?=\s*\S{0,4}?[都道府県市区町村郡]))')
+# 法人格に加えて名前の部分がある会社名
+_LEGAL_FORMS = r'(?:株式会社|有限会社|合同会社|合資会社)'
+_company_name_pattern = re.compile(
+    rf'{_LEGAL_FORMS}\s*[^\s|｜]+|[^\s|｜]+?\s*{_LEGAL_FORMS}'
+    r'|\w[\w&.\-]*\s+(?:Inc\.?|Co\.,? ?Ltd\.?|Corporation)',
+    re.IGNORECASE)
+
+# URLの妥当性チェック（呼び出しごとにコンパイルしない）
+_url_pattern = re.compile(
+    r'^https?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain
+    r'localhost|'  # localhost
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # IP
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
 class CompanyScraper:
+    """企業サイトから情報を取得するクラス
+
+    1回のscrapeごとの状態（取得済みURLなど）を持つため、リクエストごとに作成する。
+    ChromeDriverのパスやHTTPクライアント、ブラウザプールはプロセスで共有するので作成は軽い。
+    """
+
     def __init__(self):
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate, br',
+        self.headers = REQUEST_HEADERS
+
+        # 関連ページの同時取得数と1ページあたりのタイムアウト（秒）
+        self.related_page_concurrency = int(os.getenv('RELATED_PAGE_CONCURRENCY', '5'))
+        self.related_page_timeout = float(os.getenv('RELATED_PAGE_TIMEOUT', '20'))
+        # 関連ページの取得上限と1回にまとめて取得するページ数
+        self.crawl_max_pages = int(os.getenv('CRAWL_MAX_PAGES', '5'))
+        self.crawl_batch_size = int(os.getenv('CRAWL_BATCH_SIZE', '3'))
+        # 基本情報の全項目がこの確信度に達したら関連ページの取得をやめる
+        self.crawl_early_stop = os.getenv('CRAWL_EARLY_STOP', '1') != '0'
+        self.field_confidence = float(os.getenv('LLM_FIELD_CONFIDENCE', '0.7'))
+        # sitemap.xmlから関連ページの候補を補う
+        self.crawl_sitemap = os.getenv('CRAWL_SITEMAP', '1') != '0'
+        self.sitemap_timeout = float(os.getenv('CRAWL_SITEMAP_TIMEOUT', '5'))
+        # 1ページのHTMLの上限と、1リクエストで読み込むHTMLの合計の上限（バイト）
+        self.max_page_bytes = get_max_page_bytes()
+        self.memory_budget = int(float(os.getenv('SCRAPE_MEMORY_BUDGET_MB', '16')) * 1024 * 1024)
+
+        # 項目ごとのラベルのキーワード（優先順）
+        self.label_keywords = {
+            'company_name': ['会社名', '社名', '企業名'],
+            'business_description': ['事業内容', '事業概要', '企業概要', '会社概要'],
+            'address': ['所在地', '住所', '本社所在地', '会社所在地'],
+            'representative': ['代表者', '代表取締役'],
+            'tel': ['電話', 'TEL', 'Tel'],
+            'business_hours': ['営業時間', '業務時間'],
         }
-        
-        # Chromeオプションの設定
-        self.chrome_options = Options()
-        self.chrome_options.add_argument('--headless')
-        self.chrome_options.add_argument('--no-sandbox')
-        self.chrome_options.add_argument('--disable-dev-shm-usage')
-        self.chrome_options.add_argument('--disable-gpu')
-        self.chrome_options.add_argument('--window-size=1920,1080')
-        self.chrome_options.add_argument('--disable-extensions')
-        self.chrome_options.add_argument('--disable-infobars')
-        
-        try:
-            from webdriver_manager.chrome import ChromeDriverManager # type: ignore
-            from selenium.webdriver.chrome.service import Service # type: ignore
-            # ChromeDriverの自動インストール
-            self.chrome_driver_path = ChromeDriverManager().install()
-        except Exception as e:
-            print(f"ChromeDriverManager error: {e}")
-            # 環境変数からのフォールバック
-            self.chrome_driver_path = os.getenv('CHROME_DRIVER_PATH', '/usr/local/bin/chromedriver')
+        # 項目ごとの値らしさを確認するパターン（一致すれば確信度を上げる）
+        self.field_patterns = {
+            # 法人格だけ（「株式会社」のみ）は会社名とみなさない
+            'company_name': _company_name_pattern,
+            # 郵便番号は〒付きか、直後に都道府県・市区町村が続くものだけ（電話番号の一部を拾わない）
+            'address': re.compile(_POSTAL_CODE + r'|[都道府県].+?[市区町村郡]'),
+            'representative': re.compile(r'代表取締役|社長|代表者|CEO', re.IGNORECASE),
+            'tel': re.compile(r'\d{2,4}[-−]\d{2,4}[-−]\d{4}'),
+            'business_hours': re.compile(r'\d{1,2}\s*[:：時]\s*\d{0,2}'),
+        }
+        # 値の形が決まっている項目（パターンに一致しない値は確信度を上げずLLMに抽出させる）
+        self.shape_required_fields = ('address', 'tel')
+        # 項目ごとの値の長さの目安（超える場合は周辺の文章を拾っている可能性が高い）
+        self.max_field_lengths = {
+            'company_name': 60,
+            'business_description': 500,
+            'address': 120,
+            'representative': 40,
+            'tel': 30,
+            'business_hours': 100,
+        }
+
+        # HTMLパーサー（lxmlが使えない環境ではhtml.parserにフォールバック）
+        self.html_parser = os.getenv('HTML_PARSER', 'lxml')
 
         # スクレイピング済みURLを追跡
-        self.scraped_urls = set()
-        
-        # 関連ページのキーワード
-        self.relevant_keywords = [
-            '会社概要', '企業情報', 'about', 'company',
-            '採用情報', 'recruit', 'careers',
-            'お問い合わせ', 'contact',
-            '事業内容', 'business'
-        ]
+        self.scraped_urls: List[str] = []
+        # ページごとの取得方式（static / browser）
+        self.page_tiers: Dict[str, str] = {}
+
+        # 静的取得の結果がこの文字数未満ならJS描画とみなしてブラウザで取得
+        self.static_min_text_length = int(os.getenv('STATIC_MIN_TEXT_LENGTH', '100'))
+        # SPAのマウント先として使われる要素のID
+        self.spa_root_ids = ['root', 'app', '__next', '__nuxt', 'q-app', 'svelte']
+
+    @property
+    def chrome_options(self) -> Options:
+        """Chromeの起動オプション（BROWSER_PROFILE=leanでは画像・フォント・広告などを読み込まない）"""
+        return get_chrome_options()
+
+    @property
+    def chrome_driver_path(self) -> str:
+        """ChromeDriverのパス（ブラウザが必要になった時点で解決し、プロセスで共有する）"""
+        return resolve_chrome_driver_path()
 
     def validate_url(self, url: str) -> bool:
         """URLの妥当性をチェック"""
-        url_pattern = re.compile(
-            r'^https?://'  # http:// or https://
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain
-            r'localhost|'  # localhost
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # IP
-            r'(?::\d+)?'  # optional port
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-        return bool(url_pattern.match(url))
+        return bool(_url_pattern.match(url))
 
-    def get_dynamic_content(self, url: str) -> str:
-        """Seleniumを使用して動的コンテンツを取得"""
-        service = Service(self.chrome_driver_path)
-        driver = webdriver.Chrome(service=service, options=self.chrome_options)
-        
+    def _fetch_static(self, url: str, validators: Optional[Dict[str, str]] = None):
+        """HTTPクライアントでリクエスト（304またはHTMLのレスポンスのみ返す）
+
+        失敗が続いているホストはブラウザでも取得できないため、HostUnavailableErrorをそのまま送出する。
+        """
         try:
-            driver.get(url)
-            # ページの読み込みを待機
-            time.sleep(3)  # 必要に応じて調整
-            return driver.page_source
-        finally:
-            driver.quit()
+            # ホストごとの同時実行数・間隔を守って取得する
+            with get_host_scheduler(self._load_robots_txt).slot(url):
+                with span('fetch_static'):
+                    response = fetch_limited(get_http_client(self.headers), url, self.max_page_bytes,
+                                             headers=validators or None)
+        except HostUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Static fetch error ({url}): {str(e)}")
+            return None
+
+        if response.status_code == 304:
+            return response
+        content_type = response.headers.get('content-type', '')
+        if response.status_code >= 400 or 'html' not in content_type.lower():
+            return None
+        if response.truncated:
+            PAGE_TRUNCATIONS.inc(tier='static')
+            print(f"Page truncated to {self.max_page_bytes} bytes: {url}")
+        return response
 
-    def scrape(self, url: str) -> Dict[str, Optional[str]]:
-        """指定されたURLから企業情報をスクレイピング（関連ページも含む）"""
+    def get_dynamic_content(self, url: str) -> str:
+        """Seleniumを使用して動的コンテンツを取得"""
+        pool = get_browser_pool(self.chrome_driver_path, self.chrome_options)
+        # ホストの順番（同時実行数・Crawl-delay）を待ってからタブを借りる
+        # （待っている間にタブを占有して、他のホストの描画を止めないようにする）
+        with get_host_scheduler(self._load_robots_txt).slot(url):
+            # プロセス共有のプールからタブを借りる（Chromeは毎回起動しない）
+            with pool.page() as driver:
+                with span('render'):
+                    driver.get(url)
+                # ページの準備が整うまで待機（ドメインごとの実績で上限を調整）
+                with span('render_wait'):
+                    get_page_waiter().wait(driver, url)
+                html_content = driver.page_source
+        # 文字数で切り詰める（日本語のページでは上限のバイト数より大きくなりうるが、目安として十分）
+        if len(html_content) > self.max_page_bytes:
+            PAGE_TRUNCATIONS.inc(tier='browser')
+            print(f"Page truncated to {self.max_page_bytes} characters: {url}")
+            html_content = html_content[:self.max_page_bytes]
+        return html_content
+
+    def _load_robots_txt(self, url: str) -> Optional[str]:
+        """robots.txtを取得（存在しなければNone、上限を超える分は読まない）"""
+        response = fetch_limited(get_http_client(self.headers), url, ROBOTS_MAX_BYTES, content_type='',
+                                 timeout=float(os.getenv('ROBOTS_TIMEOUT', '5')))
+        if response.status_code != 200:
+            return None
+        return decode_html(response.content, response.headers.get('content-type', ''))
+
+    def scrape(self, url: str, on_event: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Optional[str]]:
+        """指定されたURLから企業情報をスクレイピング（関連ページも含む）
+
+        on_eventを指定すると、メインページの抽出結果（main_page）と
+        関連ページの取得完了（related_page）をその都度通知する。
+        """
         if not self.validate_url(url):
             raise ValueError("無効なURLです")
 
+        sitemap_executor = None
         try:
-            base_url = self._get_base_url(url)
-            self.scraped_urls = set()  # スクレイピング済みURLをリセット
-            all_text = []
-            
+            self.scraped_urls = []  # スクレイピング済みURLをリセット
+            self.page_tiers = {}
+            # ページ単位のテキストブロック（LLMの文脈とraw_textはここから作る）
+            text_blocks = []
+            # 前回からの変更を判定するためのページごとのテキストのハッシュ
+            page_hashes = {}
+
             # メインページと関連ページをスクレイピング
             main_content = self._scrape_single_page(url)
-            all_text.extend(main_content['texts'])
-            
-            # 関連ページのURLを収集
-            related_urls = self._find_related_pages(main_content['soup'], base_url)
+
+            # sitemap.xmlはメインページからの基本情報・リンクの抽出と並行して取得する
+            # （同じホストの順番を使うため、Crawl-delayのあるホストでメインページを待たせないよう後から始める）
+            sitemap_future = None
+            if self.crawl_sitemap:
+                sitemap_executor = ThreadPoolExecutor(max_workers=1)
+                sitemap_future = sitemap_executor.submit(contextvars.copy_context().run, self._load_sitemap_urls, url)
+            text_blocks.extend({"url": url, "text": text} for text in main_content['texts'])
+            page_hashes[url] = hash_texts(main_content['texts'])
             
-            # 関連ページをスクレイピング（最大5ページまで）
-            for related_url in list(related_urls)[:5]:
-                if related_url not in self.scraped_urls:
-                    related_content = self._scrape_single_page(related_url)
-                    all_text.extend(related_content['texts'])
-                    self.scraped_urls.add(related_url)
-
-            # テキストを結合
-            raw_text = ' '.join(all_text)
-
-            # 基本情報の抽出（メインページと関連ページの情報を統合）
-            company_info = {
-                "company_name": self._extract_company_name(main_content['soup']),
-                "business_description": self._extract_business_description(main_content['soup']),
-                "address": self._extract_address(main_content['soup']),
-                "representative": self._extract_representative(main_content['soup']),
-                "tel": self._extract_tel(main_content['soup']),
-                "business_hours": self._extract_business_hours(main_content['soup']),
-                "raw_text": raw_text
-            }
+            # 基本情報（取得時に抽出済み。キャッシュから返したページは保存済みの結果を使う）
+            extracted_info, confidence, main_links = self._page_extraction(main_content)
+            if on_event:
+                on_event("main_page", {
+                    "url": url,
+                    "tier": main_content['tier'],
+                    "basic_info": self._clean_company_info(extracted_info),
+                    "confidence": confidence,
+                })
+
+            # 関連ページの候補をリンクテキストとURLで採点して優先順に並べる
+            frontier = CrawlFrontier(url, self.crawl_max_pages)
+            frontier.add_links(main_links, url)
+            # 以降はテキストだけを使うので、HTMLの木はすぐに解放する
+            memory_used = main_content.get('size', 0)
+            self._release_page(main_content)
+            if sitemap_future is not None:
+                try:
+                    frontier.add_links((page_url, '') for page_url in sitemap_future.result(timeout=self.sitemap_timeout))
+                except Exception as e:
+                    print(f"Sitemap error ({url}): {str(e)}")
+
+            on_page = None
+            if on_event:
+                def on_page(page_url: str, page: Dict) -> None:
+                    on_event("related_page", {
+                        "url": page_url,
+                        "tier": page['tier'],
+                        "text_length": sum(len(text) for text in page['texts']),
+                    })
+
+            # 優先度の高いページから少しずつ取得し、全項目の確信度が揃ったら打ち切る
+            extracted_info = dict(extracted_info)
+            confidence = dict(confidence)
+            while not (self.crawl_early_stop and self._fields_confident(confidence)):
+                # 読み込んだHTMLの合計が予算を超えそうなら同時に取得するページを減らし、超えたら打ち切る
+                remaining = self.memory_budget - memory_used
+                if remaining <= 0:
+                    print(f"Memory budget exhausted after {len(self.scraped_urls)} related pages: {url}")
+                    break
+                batch_size = min(self.crawl_batch_size, max(1, remaining // self.max_page_bytes))
+                targets = frontier.pop(batch_size)
+                if not targets:
+                    break
+                with span('related_pages'):
+                    related_contents = self._scrape_pages_concurrently(targets, on_page)
+
+                # 取得順ではなく優先順で結合する
+                for related_url, related_content in zip(targets, related_contents):
+                    if related_content is None:
+                        continue
+                    text_blocks.extend({"url": related_url, "text": text} for text in related_content['texts'])
+                    self.scraped_urls.append(related_url)
+                    page_hashes[related_url] = hash_texts(related_content['texts'])
+
+                    # 関連ページで見つかった確信度の高い値で補い、次の候補のリンクも集める
+                    page_info, page_confidence, page_links = self._page_extraction(related_content)
+                    self._merge_fields(extracted_info, confidence, page_info, page_confidence)
+                    frontier.add_links(page_links, related_url)
+                    memory_used += related_content.get('size', 0)
+                    self._release_page(related_content)
+
+            # 基本情報（メインページと関連ページの情報を統合）
+            company_info = dict(extracted_info)
 
             # デバッグ情報の出力
             print(f"Main URL: {url}")
-            print(f"Related URLs scraped: {list(self.scraped_urls)}")
-            print("Total extracted text length:", len(raw_text))
+            print(f"Related URLs scraped: {self.scraped_urls}")
+            print(f"Fetch tiers: {self.page_tiers} (total: {get_tier_counts()})")
+            print("Total extracted text length:", sum(len(block["text"]) for block in text_blocks))
             print("Extracted company info:", {k: v[:100] if v else None for k, v in company_info.items()})
 
+            PAGES_PER_REQUEST.observe(len(self.page_tiers))
+            company_info["fetch_tiers"] = dict(self.page_tiers)
+            company_info["text_blocks"] = text_blocks
+            company_info["page_hashes"] = page_hashes
+            # 項目ごとの確信度（高いものはLLMに再抽出させない）
+            company_info["confidence"] = confidence
+
             return self._clean_company_info(company_info)
 
         except Exception as e:
             print(f"Scraping error: {str(e)}")
             raise Exception(f"スクレイピングに失敗しました: {str(e)}")
+        finally:
+            if sitemap_executor is not None:
+                sitemap_executor.shutdown(wait=False, cancel_futures=True)
+
+    def extract_from_html(self, url: str, pages: List[Tuple[str, str]]) -> Dict[str, Optional[str]]:
+        """保存済みのHTMLから企業情報を抽出（scrapeと同じ形式の結果を返し、通信はしない）
+
+        pagesは（ページのURL, HTML）の組のリストで、先頭をメインページとして扱う。
+        scrapeと同じく、メインページのテキスト・ハッシュは企業のURL（url）をキーにして記録する。
+        """
+        self.scraped_urls = []
+        self.page_tiers = {}
+        text_blocks = []
+        page_hashes = {}
+        extracted_info: Dict[str, Optional[str]] = {}
+        confidence: Dict[str, float] = {}
+
+        for index, (page_url, html_content) in enumerate(pages):
+            if index == 0:
+                page_url = url
+            # 取得時と同じく1ページの上限を超える分は切り捨てる
+            page = self._parse_page(html_content[:self.max_page_bytes])
+            text_blocks.extend({"url": page_url, "text": text} for text in page['texts'])
+            page_hashes[page_url] = hash_texts(page['texts'])
+            self.page_tiers[page_url] = 'archive'
+
+            page_info, page_confidence = self.extract_basic_info(page['soup'])
+            if index == 0:
+                extracted_info, confidence = dict(page_info), dict(page_confidence)
+            else:
+                self.scraped_urls.append(page_url)
+                self._merge_fields(extracted_info, confidence, page_info, page_confidence)
+            self._release_page(page)
+
+        company_info = dict(extracted_info)
+        company_info["fetch_tiers"] = dict(self.page_tiers)
+        company_info["text_blocks"] = text_blocks
+        company_info["page_hashes"] = page_hashes
+        company_info["confidence"] = confidence
+        return self._clean_company_info(company_info)
 
     def _scrape_single_page(self, url: str) -> Dict:
-        """単一ページのスクレイピング"""
-        html_content = self.get_dynamic_content(url)
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # 不要な要素を削除
-        for element in soup.find_all(['script', 'style', 'meta', 'link', 'iframe', 'noscript']):
-            element.decompose()
-
-        # コメントを削除
-        for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
-            comment.extract()
-
-        # テキストの抽出
-        texts = []
-        for tag in soup.find_all(['p', 'div', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'td', 'th', 'dd', 'dt']):
-            text = tag.get_text(strip=True)
-            if text and self._is_meaningful_text(text):
-                normalized_text = self._normalize_text(text)
-                if normalized_text:
-                    texts.append(normalized_text)
+        """単一ページのスクレイピング（キャッシュ→静的取得→ブラウザの順に試す）"""
+        cache = get_page_cache()
+        cached = cache.get(url) if cache else None
+        if cached is not None and cached.is_fresh:
+            CACHE_REQUESTS.inc(cache='page', result='hit')
+            return self._page_from_cache(cached)
+
+        # 期限切れのキャッシュはETag/Last-Modifiedで再検証する
+        validators = cached.validators if cached is not None else None
+        response = self._fetch_static(url, validators)
+        if response is not None and response.status_code == 304 and cached is not None:
+            CACHE_REQUESTS.inc(cache='page', result='revalidated')
+            cache.touch(url)
+            return self._page_from_cache(cached)
+        if cache is not None:
+            CACHE_REQUESTS.inc(cache='page', result='miss')
+
+        page = None
+        tier = 'static'
+        html_content = None
+        if response is not None and response.status_code != 304:
+            html_content = decode_html(response.content, response.headers.get('content-type', ''))
+            page = self._parse_page(html_content)
+            if self._looks_js_rendered(page['soup'], page['texts']):
+                BROWSER_FALLBACKS.inc(reason='js_rendered')
+                self._release_page(page)
+                page = None
+        else:
+            BROWSER_FALLBACKS.inc(reason='fetch_failed')
+
+        if page is None:
+            tier = 'browser'
+            html_content = self.get_dynamic_content(url)
+            page = self._parse_page(html_content)
+
+        # 基本情報とリンクは取得時に抽出し、キャッシュにも保存する（キャッシュから返す際は解析しない）
+        self._extract_page(page)
+        if cache is not None:
+            try:
+                cache.put(
+                    url, html_content, page['texts'], tier,
+                    etag=response.headers.get('etag') if response is not None else None,
+                    last_modified=response.headers.get('last-modified') if response is not None else None,
+                    extracted={'fields': page['fields'], 'confidence': page['confidence'], 'links': page['links']},
+                )
+            except Exception as e:
+                print(f"Page cache error ({url}): {str(e)}")
+
+        self.page_tiers[url] = tier
+        record_tier(tier)
+        page['tier'] = tier
+        page['size'] = len(html_content)
+        # 抽出済みなのでHTMLの木は返す前に解放する
+        self._release_page(page)
+        return page
+
+    def _page_from_cache(self, cached: CachedPage) -> Dict:
+        """キャッシュからページを復元（抽出結果が保存されていればHTMLは解析しない）"""
+        self.page_tiers[cached.url] = 'cache'
+        record_tier('cache')
+        page = {'soup': None, 'html': cached.html, 'texts': cached.texts, 'tier': 'cache', 'size': len(cached.html)}
+        if cached.extracted:
+            page['fields'] = cached.extracted['fields']
+            page['confidence'] = cached.extracted['confidence']
+            page['links'] = [tuple(link) for link in cached.extracted['links']]
+        return page
+
+    def _page_soup(self, page: Dict) -> BeautifulSoup:
+        """ページのsoupを取得（キャッシュから復元したページはここで解析）"""
+        if page.get('soup') is None:
+            page['soup'] = self._parse_page(page['html'])['soup']
+        return page['soup']
+
+    def _extract_page(self, page: Dict) -> None:
+        """ページの基本情報・確信度・リンクを抽出してページに記録"""
+        soup = self._page_soup(page)
+        page['fields'], page['confidence'] = self.extract_basic_info(soup)
+        page['links'] = list(self._iter_links(soup))
+
+    def _page_extraction(self, page: Dict) -> Tuple[Dict[str, Optional[str]], Dict[str, float], List[Tuple[str, str]]]:
+        """ページの（基本情報, 確信度, リンク）を取得（抽出結果のない古いキャッシュはここで解析）"""
+        if 'fields' not in page:
+            self._extract_page(page)
+        return page['fields'], page['confidence'], page['links']
+
+    def _release_page(self, page: Dict) -> None:
+        """ページのHTMLと解析結果の木を解放（抽出済みのテキストだけを残す）"""
+        soup = page.pop('soup', None)
+        if soup is not None:
+            # 要素間の循環参照を切って、GCを待たずにメモリを返す
+            soup.decompose()
+        page.pop('html', None)
+
+    def _scrape_pages_concurrently(self, urls: List[str],
+                                   on_page: Optional[Callable[[str, Dict], None]] = None) -> List[Optional[Dict]]:
+        """複数ページを並行して取得（失敗・タイムアウトしたページはNone）
+
+        on_pageを指定すると、取得が完了したページを完了順に通知する。
+        """
+        if not urls:
+            return []
+
+        results: List[Optional[Dict]] = [None] * len(urls)
+        started: Dict[int, float] = {}
+        workers = max(1, min(self.related_page_concurrency, len(urls)))
+        # 待ち行列に残ったページも含めた全体の上限
+        stage_deadline = time.monotonic() + self.related_page_timeout * math.ceil(len(urls) / workers)
+
+        def run(index: int, page_url: str) -> Dict:
+            started[index] = time.monotonic()
+            return self._scrape_single_page(page_url)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            # 処理時間の記録先などを引き継ぐため、呼び出し元のコンテキストで実行する
+            futures = {executor.submit(contextvars.copy_context().run, run, i, u): i for i, u in enumerate(urls)}
+            pending = set(futures)
+            while pending:
+                now = time.monotonic()
+                deadlines = {}
+                for future in pending:
+                    index = futures[future]
+                    if index in started:
+                        deadlines[future] = started[index] + self.related_page_timeout
+                    else:
+                        deadlines[future] = stage_deadline
+
+                # 制限時間を過ぎたページは待たずに打ち切る
+                expired = {f for f, d in deadlines.items() if d <= now}
+                for future in expired:
+                    future.cancel()
+                    print(f"Related page timed out: {urls[futures[future]]}")
+                pending -= expired
+                if not pending:
+                    break
+
+                timeout = min(deadlines[f] for f in pending) - now
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        print(f"Related page error ({urls[index]}): {str(e)}")
+                        continue
+                    if on_page:
+                        on_page(urls[index], results[index])
+        finally:
+            # タイムアウトしたページの終了は待たない
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        return {'soup': soup, 'texts': texts}
+        return results
 
-    def _get_base_url(self, url: str) -> str:
-        """URLのベース部分を取得"""
-        from urllib.parse import urlparse
-        parsed = urlparse(url)
-        return f"{parsed.scheme}://{parsed.netloc}"
+    def _make_soup(self, html_content: str) -> BeautifulSoup:
+        """設定されたパーサーでHTMLを解析"""
+        try:
+            return BeautifulSoup(html_content, self.html_parser)
+        except FeatureNotFound:
+            print(f"HTML parser '{self.html_parser}' is not available, falling back to html.parser")
+            self.html_parser = 'html.parser'
+            return BeautifulSoup(html_content, self.html_parser)
+
+    def _looks_js_rendered(self, soup: BeautifulSoup, texts: list[str]) -> bool:
+        """静的HTMLがJavaScriptで描画されるページかどうかを判定"""
+        # bodyが空
+        if not soup.body or not soup.body.get_text(strip=True):
+            return True
+
+        # SPAのマウント先が空のまま
+        for root_id in self.spa_root_ids:
+            root = soup.find(id=root_id)
+            if root is not None and not root.get_text(strip=True):
+                return True
+        if soup.find(attrs={'ng-app': True}) and not texts:
+            return True
+
+        # 意味のあるテキストが少なすぎる
+        return sum(len(text) for text in texts) < self.static_min_text_length
+
+    def _parse_page(self, html_content: str) -> Dict:
+        """HTMLを解析して不要な要素を除いたテキストを抽出"""
+        with span('parse'):
+            soup = self._make_soup(html_content)
+
+            # 不要な要素を削除
+            for element in soup.find_all(['script', 'style', 'meta', 'link', 'iframe', 'noscript']):
+                element.decompose()
+
+            # コメントを削除
+            for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+                comment.extract()
+
+            # テキストの抽出（テキストノードを1回だけ走査してブロック単位にまとめる）
+            texts = []
+            for block in iter_text_blocks(soup.body or soup):
+                normalized_text = self._normalize_text(block)
+                if normalized_text and self._is_meaningful_text(normalized_text):
+                    texts.append(normalized_text)
 
-    def _find_related_pages(self, soup: BeautifulSoup, base_url: str) -> set:
-        """関連ページのURLを収集"""
-        related_urls = set()
-        
+            return {'soup': soup, 'texts': texts}
+
+    def _iter_links(self, soup: BeautifulSoup) -> Iterator[Tuple[str, str]]:
+        """ページ内のリンクを（href, リンクテキスト）の組で列挙"""
         for a in soup.find_all('a', href=True):
-            href = a.get('href')
-            link_text = a.get_text(strip=True).lower()
-            
-            # 関連ページかどうかをチェック
-            is_relevant = any(keyword in link_text for keyword in self.relevant_keywords)
-            
-            if is_relevant and href:
-                # 相対URLを絶対URLに変換
-                if href.startswith('/'):
-                    full_url = base_url + href
-                elif href.startswith('http'):
-                    full_url = href
-                else:
-                    continue
-                    
-                # 同じドメインのURLのみを追加
-                if base_url in full_url:
-                    related_urls.add(full_url)
-        
-        return related_urls
+            # 画像だけのリンクはalt属性をリンクテキストとみなす
+            text = a.get_text(' ', strip=True) or ' '.join(img.get('alt', '') for img in a.find_all('img'))
+            yield a['href'], text
+
+    def _fields_confident(self, confidence: Dict[str, float]) -> bool:
+        """基本情報の全項目が確信度のしきい値に達しているか"""
+        return all(confidence.get(field, 0.0) >= self.field_confidence for field in self.label_keywords)
+
+    def _merge_fields(self, extracted_info: Dict[str, Optional[str]], confidence: Dict[str, float],
+                      page_info: Dict[str, Optional[str]], page_confidence: Dict[str, float]) -> None:
+        """関連ページの値のうち、確信度がより高い項目で置き換える"""
+        for field, value in page_info.items():
+            if value and page_confidence.get(field, 0.0) > confidence.get(field, 0.0):
+                extracted_info[field] = value
+                confidence[field] = page_confidence[field]
+
+    def _load_sitemap_urls(self, url: str, max_sitemaps: int = 3) -> List[str]:
+        """sitemap.xmlに載っているページのURLを取得（サイトマップのインデックスは数件までたどる）"""
+        parsed = urlparse(url)
+        queue = [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"]
+        pages: List[str] = []
+        fetched = 0
+        while queue and fetched < max_sitemaps:
+            sitemap_url = queue.pop(0)
+            fetched += 1
+            with get_host_scheduler(self._load_robots_txt).slot(sitemap_url):
+                # 巨大なサイトマップもページと同じ上限までしか読まない
+                response = fetch_limited(get_http_client(self.headers), sitemap_url, self.max_page_bytes,
+                                         content_type='', timeout=self.sitemap_timeout)
+            if response.status_code != 200:
+                continue
+            if response.truncated:
+                PAGE_TRUNCATIONS.inc(tier='sitemap')
+            page_urls, child_sitemaps = parse_sitemap(
+                decode_html(response.content, response.headers.get('content-type', '')))
+            pages.extend(page_urls)
+            queue.extend(child_sitemaps)
+        return pages
 
     def _normalize_text(self, text: str) -> str:
         """テキストの正規化"""
@@ -223,7 +633,7 @@ class CompanyScraper:
                 cleaned_info[key] = value
         return cleaned_info
 
-    def _extract_company_name(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_company_name(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """会社名の抽出"""
         # メタデータから探す
         meta_title = soup.find('meta', property='og:site_name')
@@ -242,7 +652,8 @@ class CompanyScraper:
                 ]
                 for pattern in company_patterns:
                     match = re.search(pattern, title)
-                    if match:
+                    # 法人格だけに一致した場合は次のパターンを試す
+                    if match and _company_name_pattern.search(match.group().strip()):
                         return match.group().strip()
 
         # h1タグから探す
@@ -251,20 +662,19 @@ class CompanyScraper:
             return h1.get_text(strip=True)
 
         # 会社名を含むと思われる要素を探す
-        company_keywords = ['会社名', '社名', '企業名']
-        for keyword in company_keywords:
-            result = self._find_in_table(soup, [keyword])
+        for keyword in self.label_keywords['company_name']:
+            result = self._find_in_table(soup, [keyword], index)
             if result:
                 return result
 
         return None
 
-    def _extract_business_description(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_business_description(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """事業内容の抽出"""
-        keywords = ['事業内容', '事業概要', '企業概要', '会社概要']
+        keywords = self.label_keywords['business_description']
         
         # テーブルから探す
-        description = self._find_in_table(soup, keywords)
+        description = self._find_in_table(soup, keywords, index)
         if description:
             return description
 
@@ -280,17 +690,17 @@ class CompanyScraper:
         
         return None
 
-    def _extract_address(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_address(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """所在地の抽出"""
-        keywords = ['所在地', '住所', '本社所在地', '会社所在地']
+        keywords = self.label_keywords['address']
         
         # テーブルから探す
-        address = self._find_in_table(soup, keywords)
+        address = self._find_in_table(soup, keywords, index)
         if address:
             return address
 
         # 特定のパターンの住所を探す（郵便番号から始まるなど）
-        postal_pattern = re.compile(r'〒?\d{3}[-−]\d{4}.*?(?=\n|$)')
+        postal_pattern = re.compile(_POSTAL_CODE + r'.*?(?=\n|$)')
         for text in soup.stripped_strings:
             match = postal_pattern.search(text)
             if match:
@@ -298,13 +708,13 @@ class CompanyScraper:
 
         return None
 
-    def _extract_representative(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_representative(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """代表者名の抽出"""
-        return self._find_in_table(soup, ['代表者', '代表取締役'])
+        return self._find_in_table(soup, self.label_keywords['representative'], index)
 
-    def _extract_tel(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_tel(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """電話番号の抽出"""
-        tel = self._find_in_table(soup, ['電話', 'TEL', 'Tel'])
+        tel = self._find_in_table(soup, self.label_keywords['tel'], index)
         if not tel:
             # 電話番号のパターンを探す
             pattern = re.compile(r'\d{2,4}[-−]\d{2,4}[-−]\d{4}')
@@ -314,39 +724,64 @@ class CompanyScraper:
                     return match.group()
         return tel
 
-    def _extract_business_hours(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_business_hours(self, soup: BeautifulSoup, index: Optional[LabelIndex] = None) -> Optional[str]:
         """営業時間の抽出"""
-        return self._find_in_table(soup, ['営業時間', '業務時間'])
-
-    def _find_in_table(self, soup: BeautifulSoup, keywords: list[str]) -> Optional[str]:
+        return self._find_in_table(soup, self.label_keywords['business_hours'], index)
+
+    def extract_basic_info(self, soup: BeautifulSoup) -> Tuple[Dict[str, Optional[str]], Dict[str, float]]:
+        """ページから基本情報を抽出し、項目ごとの確信度と合わせて返す"""
+        with span('extract'):
+            index = self._build_label_index(soup)
+            extracted_info = {
+                "company_name": self._extract_company_name(soup, index),
+                "business_description": self._extract_business_description(soup, index),
+                "address": self._extract_address(soup, index),
+                "representative": self._extract_representative(soup, index),
+                "tel": self._extract_tel(soup, index),
+                "business_hours": self._extract_business_hours(soup, index),
+            }
+            return extracted_info, self._score_fields(extracted_info, index)
+
+    def _score_fields(self, extracted_info: Dict[str, Optional[str]], index: LabelIndex) -> Dict[str, float]:
+        """ルールベースで抽出した各項目の確信度（0〜1）を採点"""
+        scores = {}
+        for field, value in extracted_info.items():
+            value = self._normalize_text(value) if value else ""
+            if not value:
+                scores[field] = 0.0
+                continue
+
+            score = 0.3
+            # 表や定義リストのラベルから取れた値か（隣接要素からの推測はラベルとみなさない）
+            labeled = index.lookup_labeled(self.label_keywords[field])
+            labeled = bool(labeled) and self._normalize_text(labeled) == value
+            if labeled:
+                score += 0.4
+            # 値の形が項目らしいか（郵便番号、電話番号など）
+            pattern = self.field_patterns.get(field)
+            shaped = bool(pattern and pattern.search(value))
+            if shaped:
+                score += 0.4
+            if len(value) > self.max_field_lengths[field]:
+                score -= 0.3
+            # ラベルのない値は形が合っていてもしきい値に届かせない（LLMに確認させる）
+            if not labeled:
+                score = min(score, 0.5)
+            # 形が決まっている項目は、形が合わなければLLMに抽出させる
+            if field in self.shape_required_fields and not shaped:
+                score = min(score, 0.3)
+            scores[field] = round(min(max(score, 0.0), 1.0), 2)
+        return scores
+
+    def _build_label_index(self, soup: BeautifulSoup) -> LabelIndex:
+        """全項目のキーワードを対象にラベルと値の索引を作成"""
+        keywords = [k for field_keywords in self.label_keywords.values() for k in field_keywords]
+        return LabelIndex(soup, keywords)
+
+    def _find_in_table(self, soup: BeautifulSoup, keywords: list[str],
+                       index: Optional[LabelIndex] = None) -> Optional[str]:
         """テーブルから特定のキーワードに関連する情報を探す"""
-        for keyword in keywords:
-            # 大文字小文字を区別せず、部分一致で検索するための正規表現
-            pattern = re.compile(keyword, re.IGNORECASE)
-            
-            # テーブル内を探索
-            for table in soup.find_all('table'):
-                # th/tdの組み合わせを探す
-                for th in table.find_all('th'):
-                    if pattern.search(th.get_text(strip=True)):
-                        td = th.find_next('td')
-                        if td:
-                            return td.get_text(strip=True)
-
-            # dt/ddの組み合わせを探す
-            for dt in soup.find_all('dt'):
-                if pattern.search(dt.get_text(strip=True)):
-                    dd = dt.find_next('dd')
-                    if dd:
-                        return dd.get_text(strip=True)
-
-            # divやpタグ内のテキストを探す
-            for element in soup.find_all(['div', 'p', 'span']):
-                text = element.get_text(strip=True)
-                if pattern.search(text):
-                    # キーワードを含む要素の次の要素を探す
-                    next_element = element.find_next(['div', 'p', 'span'])
-                    if next_element:
-                        return next_element.get_text(strip=True)
-
-        return None
+        # 索引にないキーワードが含まれる場合はそのキーワードで索引を作り直す
+        if index is None or any(k.lower() not in index.keywords for k in keywords):
+            index = LabelIndex(soup, keywords)
+        return index.lookup(keywords)
@@ -0,0 +1,64 @@
+from bs4 import NavigableString, Tag  # type: ignore
+from typing import Dict, Iterable, Iterator, Optional
+
+# テキストのまとまりを区切る要素（これ以外のspan・a・bなどは親のまとまりに含める）
+BLOCK_LEVEL_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'body', 'br', 'caption', 'dd', 'details',
+    'dialog', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p',
+    'pre', 'section', 'summary', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+])
+
+
+def iter_text_blocks(root: Tag) -> Iterator[str]:
+    """テキストノードを文書順に1回だけ走査し、ブロック単位にまとめて返す
+
+    入れ子の要素ごとにget_textを呼ぶと同じテキストが深さの分だけ重複するため、
+    テキストノードは必ず1つのブロックにだけ属するようにする。
+    """
+    parts: list[str] = []
+    # 深さ優先で走査するスタック（Noneはブロック要素の終わりを表す）
+    stack: list = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            # ブロック要素の終わり
+            if parts:
+                yield ''.join(parts)
+                parts = []
+            continue
+        if isinstance(node, NavigableString):
+            # コメントやCDATAなどの特殊な文字列は除く
+            if type(node) is NavigableString:
+                parts.append(str(node))
+            continue
+        if not isinstance(node, Tag):
+            continue
+
+        if node.name in BLOCK_LEVEL_TAGS:
+            # ブロック要素の始まりと終わりでそれまでのテキストを区切る
+            if parts:
+                yield ''.join(parts)
+                parts = []
+            stack.append(None)
+        stack.extend(reversed(node.contents))
+
+    if parts:
+        yield ''.join(parts)
+
+
+def join_text_blocks(blocks: Iterable[Dict[str, str]], limit: Optional[int] = None) -> str:
+    """ページ単位のテキストブロックを空白区切りで1つのテキストにする
+
+    limitを指定すると、その文字数を超えた時点で残りのブロックは結合しない
+    （結果はlimitを最大で1ブロック分超えるので、切り詰めは呼び出し元で行う）。
+    """
+    parts: list[str] = []
+    length = 0
+    for block in blocks:
+        if limit is not None and length > limit:
+            break
+        text = block.get('text', '')
+        parts.append(text)
+        length += len(text) + 1
+    return ' '.join(parts)
@@ -0,0 +1,137 @@
+"""ジョブキューのワーカー
+
+使い方:
+    python -m app.worker --processes 4
+
+同じマシン上であれば、同じJOBS_DBを使うワーカーをいくつ起動しても問題ない。
+SQLiteのWALモードはネットワークファイルシステムでは動作しないため、複数のマシンでは共有できない。
+"""
+from typing import Dict, Optional
+import multiprocessing
+import argparse
+import threading
+import traceback
+import asyncio
+import socket
+import signal
+import os
+from .jobs import JobStore
+from .pipeline import analyze_company, build_error_response
+from .lifecycle import warm_up, shutdown
+
+
+class _Heartbeat:
+    """処理中のジョブの占有期限を定期的に延長するスレッド"""
+
+    def __init__(self, store: JobStore, job_id: str, worker_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = max(1.0, self.store.visibility_timeout / 3)
+        while not self._stop.wait(interval):
+            if not self.store.heartbeat(self.job_id, self.worker_id):
+                break
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def process_job(store: JobStore, job: Dict, worker_id: str, loop: asyncio.AbstractEventLoop) -> None:
+    """ジョブを1件処理して結果を記録"""
+    print(f"[{worker_id}] Job {job['id']} started (attempt {job['attempts']}): {job['url']}")
+    with _Heartbeat(store, job['id'], worker_id):
+        try:
+            options = job['options']
+            result = loop.run_until_complete(analyze_company(
+                job['url'],
+                include_timings=bool(options.get('timings')),
+                force=bool(options.get('force')),
+                include_raw_text=bool(options.get('raw_text')),
+            ))
+        except ValueError as e:
+            # URLが不正な場合は再試行しても結果は変わらない
+            store.fail(job['id'], worker_id, str(e), build_error_response(str(e)), retryable=False)
+            print(f"[{worker_id}] Job {job['id']} rejected: {str(e)}")
+            return
+        except Exception as e:
+            print(f"[{worker_id}] Job {job['id']} error: {traceback.format_exc()}")
+            error = f"処理に失敗しました: {str(e)}"
+            store.fail(job['id'], worker_id, error, build_error_response(error))
+            return
+
+    if "error" in result:
+        store.fail(job['id'], worker_id, result["error"], result)
+        print(f"[{worker_id}] Job {job['id']} failed: {result['error']}")
+    else:
+        store.complete(job['id'], worker_id, result)
+        print(f"[{worker_id}] Job {job['id']} succeeded")
+
+
+def run_worker(db_path: Optional[str] = None, poll_interval: float = 1.0) -> None:
+    """ジョブを取得して処理し続ける（SIGTERM/SIGINTで現在のジョブ完了後に終了）"""
+    store = JobStore(db_path)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    # Chromeは必要になった時点で起動する（JavaScriptで描画するサイトがなければメモリを使わない）
+    warm_up(browser=False)
+    print(f"[{worker_id}] Worker started")
+    try:
+        while not stopping.is_set():
+            job = store.claim(worker_id)
+            if job is None:
+                stopping.wait(poll_interval)
+                continue
+            process_job(store, job, worker_id, loop)
+    finally:
+        loop.close()
+        store.close()
+        shutdown()
+        print(f"[{worker_id}] Worker stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スクレイピングジョブのワーカーを起動")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="起動するワーカープロセス数（既定値: CPUコア数）")
+    parser.add_argument('--db', default=None, help="ジョブキューのSQLiteファイル（既定値: JOBS_DB）")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="ジョブがない時の確認間隔（秒）")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.db, args.poll_interval)
+        return
+
+    # Chromeやスレッドを抱えたままforkしないようspawnで起動する
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=run_worker, args=(args.db, args.poll_interval), daemon=False)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # 子プロセスにも同じシグナルが届いているので終了を待つ
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
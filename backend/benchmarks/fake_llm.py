@@ -0,0 +1,77 @@
+"""ベンチマーク用のGeminiの代替
+
+google.generativeai.GenerativeModelを置き換え、プロンプトで指定された項目に
+決まった値を返す。応答までの待ち時間は設定できる。
+"""
+from typing import AsyncIterator, Dict, List
+import asyncio
+import json
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StreamResponse:
+    """generate_content_async(stream=True)の応答（チャンクごとに返す）"""
+
+    def __init__(self, text: str, chunk_size: int, chunk_latency: float):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+
+    async def _chunks(self) -> AsyncIterator[_Response]:
+        for start in range(0, len(self.text), self.chunk_size):
+            if self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield _Response(self.text[start:start + self.chunk_size])
+
+    def __aiter__(self) -> AsyncIterator[_Response]:
+        return self._chunks()
+
+
+class _TokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+class FakeGenerativeModel:
+    """プロンプトの出力形式に合わせたJSONを返すモデル"""
+
+    # 応答までの待ち時間（秒）とストリーミングのチャンク
+    latency = 0.0
+    chunk_size = 64
+    chunk_latency = 0.0
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    def _answer(self, prompt: str) -> str:
+        try:
+            output_format = json.loads(prompt[prompt.index('{'):prompt.rindex('}') + 1])
+        except ValueError:
+            output_format = {}
+        answer: Dict[str, Dict[str, str]] = {}
+        for section, fields in output_format.items():
+            answer[section] = {field: f"{field}（ベンチマーク）" for field in fields}
+        return json.dumps(answer, ensure_ascii=False)
+
+    async def generate_content_async(self, contents: List[Dict[str, str]], stream: bool = False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._answer(contents[0]['text'])
+        if stream:
+            return _StreamResponse(text, self.chunk_size, self.chunk_latency)
+        return _Response(text)
+
+    async def count_tokens_async(self, contents) -> _TokenCount:
+        text = contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False)
+        return _TokenCount(len(text))
+
+
+def install(latency: float = 0.0) -> None:
+    """google.generativeaiのモデルを置き換える"""
+    import google.generativeai as genai  # type: ignore
+    FakeGenerativeModel.latency = latency
+    genai.GenerativeModel = FakeGenerativeModel
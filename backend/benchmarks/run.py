@@ -0,0 +1,325 @@
+"""オフラインのベンチマーク
+
+保存済みの企業サイトのHTML（benchmarks/corpus）をローカルのHTTPサーバーで配信し、
+Geminiの代わりに決まった応答を返すモデルを使って、スクレイピングと抽出、APIの性能を測る。
+
+使い方:
+    python -m benchmarks.run                          # 実行して基準値と比較
+    python -m benchmarks.run --save-baseline          # 結果を基準値として保存
+    python -m benchmarks.run --scenarios parse,extract --iterations 200
+
+基準値より悪化した指標があれば終了コード1で終了する。
+"""
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional
+import multiprocessing
+import argparse
+import threading
+import asyncio
+import json
+import math
+import time
+import sys
+import os
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, 'corpus')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# 各サイトのトップページ（関連ページはスクレイパーがリンクから辿る）
+SITES = ['alpha/index.html', 'beta/index.html', 'gamma/index.html']
+
+# 基準値との比較に使う指標（Trueは大きいほど良い）
+COMPARED_METRICS = {
+    'throughput': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_corpus() -> Iterator[str]:
+    """コーパスをローカルのHTTPサーバーで配信し、ベースURLを返す"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=CORPUS_DIR))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def corpus_pages() -> List[str]:
+    """コーパス内のHTMLファイルの一覧"""
+    pages = []
+    for root, _, files in os.walk(CORPUS_DIR):
+        pages.extend(os.path.join(root, name) for name in files if name.endswith('.html'))
+    return sorted(pages)
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """最近傍法でパーセンタイルを求める"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(ratio * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """このプロセスの最大常駐メモリ（MB）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies: List[float], elapsed: float, stages: Optional[Dict[str, List[float]]] = None) -> Dict:
+    """所要時間の一覧から結果をまとめる"""
+    summary = {
+        'count': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_rss_mb': round(peak_rss_mb() or 0.0, 1),
+    }
+    if stages:
+        summary['stages_p50_ms'] = {
+            stage: round(percentile(values, 0.50) * 1000, 3) for stage, values in sorted(stages.items())
+        }
+    return summary
+
+
+def _collect_stages(stages: Dict[str, List[float]], timings: Dict) -> None:
+    for stage, entry in timings.get('stages', {}).items():
+        stages.setdefault(stage, []).append(entry['seconds'])
+
+
+def bench_parse(options: argparse.Namespace) -> Dict:
+    """HTMLの解析とテキスト抽出"""
+    from app.scraper import CompanyScraper
+    scraper = CompanyScraper()
+    documents = [open(path, encoding='utf-8').read() for path in corpus_pages()]
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(options.iterations):
+        for html in documents:
+            begin = time.perf_counter()
+            scraper._parse_page(html)
+            latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def bench_extract(options: argparse.Namespace) -> Dict:
+    """解析済みのページからの基本情報の抽出"""
+    from app.scraper import CompanyScraper
+    scraper = CompanyScraper()
+    soups = [scraper._parse_page(open(path, encoding='utf-8').read())['soup'] for path in corpus_pages()]
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(options.iterations):
+        for soup in soups:
+            begin = time.perf_counter()
+            scraper.extract_basic_info(soup)
+            latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def bench_scrape(options: argparse.Namespace) -> Dict:
+    """CompanyScraper.scrape（関連ページを含む1社分）"""
+    from app.scraper import CompanyScraper
+    from app.metrics import track_request
+    scraper = CompanyScraper()
+    latencies = []
+    stages: Dict[str, List[float]] = {}
+    with serve_corpus() as base_url:
+        # 接続の確立など初回だけかかる処理を除く
+        scraper.scrape(f"{base_url}/{SITES[0]}")
+        started = time.perf_counter()
+        for _ in range(max(1, options.iterations // 10)):
+            for site in SITES:
+                with track_request() as timings:
+                    begin = time.perf_counter()
+                    scraper.scrape(f"{base_url}/{site}")
+                    latencies.append(time.perf_counter() - begin)
+                _collect_stages(stages, timings.as_dict())
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, stages)
+
+
+def bench_api(options: argparse.Namespace) -> Dict:
+    """POST /api/scrape（スクレイピング＋LLM）を同時に複数送った場合"""
+    import httpx  # type: ignore
+    from app.main import app
+
+    async def run(base_url: str) -> Dict:
+        latencies = []
+        stages: Dict[str, List[float]] = {}
+        urls = [f"{base_url}/{SITES[i % len(SITES)]}" for i in range(options.requests)]
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            async def worker():
+                while not queue.empty():
+                    url = queue.get_nowait()
+                    begin = time.perf_counter()
+                    response = await client.post("/api/scrape", json={"url": url, "timings": True})
+                    latencies.append(time.perf_counter() - begin)
+                    body = response.json()
+                    if response.status_code != 200 or body.get("message") != "Success":
+                        raise RuntimeError(f"{url}: {response.status_code} {body}")
+                    _collect_stages(stages, body.get("timings", {}))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(options.concurrency)))
+            elapsed = time.perf_counter() - started
+        return summarize(latencies, elapsed, stages)
+
+    with serve_corpus() as base_url:
+        return asyncio.run(run(base_url))
+
+
+SCENARIOS: Dict[str, Callable[[argparse.Namespace], Dict]] = {
+    'parse': bench_parse,
+    'extract': bench_extract,
+    'scrape': bench_scrape,
+    'api': bench_api,
+}
+
+
+def _prepare_environment(options: argparse.Namespace) -> None:
+    """外部サービスとキャッシュを使わない設定にする（appを読み込む前に呼ぶ）"""
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+    os.environ['PAGE_CACHE_ENABLED'] = '0'
+    os.environ['LLM_CACHE_TTL'] = '0'
+    os.environ['COMPANY_STORE_ENABLED'] = '0'
+    os.environ.setdefault('MAX_CONCURRENT_SCRAPES', str(options.concurrency))
+    # コーパスのサイトはすべて同じホストで配信するため、ホストごとの制限は外す
+    os.environ.setdefault('HOST_MAX_CONCURRENCY', '64')
+    os.environ.setdefault('HOST_MIN_INTERVAL', '0')
+    from benchmarks.fake_llm import install
+    install(options.llm_latency)
+
+
+def _run_scenario(name: str, options: argparse.Namespace, results) -> None:
+    """別プロセスでシナリオを実行（最大メモリをシナリオごとに測るため）"""
+    # 計測に関係のないログを出さない
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        _prepare_environment(options)
+        results.put((name, SCENARIOS[name](options), None))
+    except Exception as e:
+        results.put((name, None, f"{type(e).__name__}: {e}"))
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_delta_ms: float) -> List[str]:
+    """基準値より許容範囲を超えて悪化した指標を返す"""
+    regressions = []
+    for scenario, summary in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            current, reference = summary.get(metric), base.get(metric)
+            if not current or not reference:
+                continue
+            change = (current - reference) / reference
+            worse = -change if higher_is_better else change
+            # ごく短い処理のぶれは無視する
+            if metric.endswith('_ms') and abs(current - reference) < min_delta_ms:
+                continue
+            if worse > tolerance:
+                regressions.append(f"{scenario}.{metric}: {reference} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]) -> None:
+    print(f"{'scenario':<10}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for name, summary in results.items():
+        print(f"{name:<10}{summary['count']:>8}{summary['throughput']:>10}{summary['p50_ms']:>10}"
+              f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['peak_rss_mb']:>9}")
+        for stage, value in summary.get('stages_p50_ms', {}).items():
+            print(f"    {stage:<16} p50 {value} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スクレイパーのオフラインベンチマーク")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"実行するシナリオ（カンマ区切り、既定値: {','.join(SCENARIOS)}）")
+    parser.add_argument('--iterations', type=int, default=50, help="parse/extractの繰り返し回数（scrapeはその1/10）")
+    parser.add_argument('--requests', type=int, default=60, help="apiシナリオのリクエスト数")
+    parser.add_argument('--concurrency', type=int, default=8, help="apiシナリオの同時リクエスト数")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="代替LLMの応答時間（秒）")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基準値のJSONファイル")
+    parser.add_argument('--save-baseline', action='store_true', help="結果を基準値として保存")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="悪化とみなす変化率（既定値: 0.2 = 20%%）")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="これ未満の時間の差は無視する（ミリ秒）")
+    parser.add_argument('--json', default=None, help="結果をJSONで保存するファイル")
+    options = parser.parse_args()
+
+    names = [name.strip() for name in options.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"不明なシナリオです: {', '.join(unknown)}")
+
+    # 前のシナリオのメモリやスレッドを引き継がないようspawnで起動する
+    context = multiprocessing.get_context('spawn')
+    results: Dict[str, Dict] = {}
+    failed = False
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target=_run_scenario, args=(name, options, queue))
+        process.start()
+        _, summary, error = queue.get()
+        process.join()
+        if error:
+            print(f"{name}: 失敗しました ({error})", file=sys.stderr)
+            failed = True
+            continue
+        results[name] = summary
+
+    print_results(results)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if options.save_baseline:
+        with open(options.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基準値を保存しました: {options.baseline}")
+    elif os.path.exists(options.baseline):
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.tolerance, options.min_delta_ms)
+        if regressions:
+            print("基準値より悪化した指標:")
+            for line in regressions:
+                print(f"  {line}")
+            failed = True
+        else:
+            print("基準値からの悪化はありません")
+    else:
+        print(f"基準値がないため比較しません（--save-baseline で {options.baseline} に保存できます）")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
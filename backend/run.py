@@ -1,9 +1,35 @@
+import argparse
+import os
 import uvicorn # type: ignore
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",  # すべてのインターフェースでリッスン
-        port=8000,
-        reload=True      # 開発時の自動リロード
-    ) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="APIサーバーを起動")
+    parser.add_argument('--production', action='store_true',
+                        help="本番用に自動リロードなし・複数ワーカーで起動")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '0')) or None,
+                        help="本番用のワーカープロセス数（既定値: WEB_CONCURRENCY またはCPUコア数）")
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))  # すべてのインターフェースでリッスン
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    args = parser.parse_args()
+
+    if args.production:
+        workers = args.workers or os.cpu_count() or 1
+        if workers > 1:
+            # メトリクスはプロセスごとに集計されるため、/api/metricsは応答したワーカーの値だけになる
+            print(f"Starting {workers} workers: /api/metrics reports per-worker values")
+        # ワーカーごとに起動時の準備（Chromeの事前起動など）を行ってから受け付けを始める
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            proxy_headers=True,
+            access_log=False,
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True      # 開発時の自動リロード
+        )
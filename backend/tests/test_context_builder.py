@@ -0,0 +1,47 @@
+"""文脈を作る際のほぼ一致するブロックの除去の確認"""
+import unittest
+import random
+from app.context_builder import ContextBuilder
+
+_TEXT = ('当社は1985年の創業以来、物流システムの開発と運用を通じて地域のお客様の事業を支えてまいりました。'
+         '現在は全国12か所の拠点で、倉庫管理から配送までを一貫してご提供しています。'
+         '今後も品質と安全を第一に、持続可能な物流の実現に取り組んでまいります。')
+
+
+class DeduplicateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = ContextBuilder()
+
+    def test_few_character_edits_are_deduplicated(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            edited = list(_TEXT)
+            for position in rng.sample(range(len(_TEXT)), rng.randint(1, 3)):
+                edited[position] = rng.choice('あいうえおアイウエオ')
+            edited = ''.join(edited)
+            with self.subTest(edited=edited):
+                kept = self.builder.deduplicate([
+                    {'url': 'https://example.co.jp/', 'text': _TEXT},
+                    {'url': 'https://example.co.jp/company/', 'text': edited},
+                ])
+                self.assertEqual(len(kept), 1)
+                self.assertEqual(kept[0].pages, {'https://example.co.jp/', 'https://example.co.jp/company/'})
+
+    def test_different_blocks_are_kept(self):
+        other = '採用情報：新卒・中途ともに通年で募集しています。未経験の方も研修制度がありますので安心してご応募ください。'
+        kept = self.builder.deduplicate([
+            {'url': 'https://example.co.jp/', 'text': _TEXT},
+            {'url': 'https://example.co.jp/recruit/', 'text': other},
+        ])
+        self.assertEqual(len(kept), 2)
+
+    def test_sketch_is_stable(self):
+        # 文脈とそのキャッシュのキーがプロセスをまたいで変わらないこと
+        shingles = self.builder._shingles(_TEXT)
+        self.assertEqual(self.builder._sketch(shingles), ContextBuilder()._sketch(shingles))
+        self.assertEqual(len(self.builder._sketch(shingles)), self.builder.sketch_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
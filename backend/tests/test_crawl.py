@@ -0,0 +1,75 @@
+"""関連ページの取得の打ち切りと基本情報の統合の確認"""
+import unittest
+from typing import Dict
+from app.scraper import CompanyScraper
+
+MAIN_URL = 'https://example.co.jp/'
+
+PAGES = {
+    # 電話番号だけがラベルのない（形だけが合う）値
+    MAIN_URL: """
+        <html><body>
+        <table>
+          <tr><th>会社名</th><td>株式会社サンプル</td></tr>
+          <tr><th>事業内容</th><td>業務システムの開発</td></tr>
+          <tr><th>所在地</th><td>〒100-0001 東京都千代田区千代田1-1</td></tr>
+          <tr><th>代表者</th><td>代表取締役 山田 太郎</td></tr>
+          <tr><th>営業時間</th><td>9:00〜18:00</td></tr>
+        </table>
+        <a href="/company/">会社概要</a>
+        <p>お問い合わせ 03-0000-0000</p>
+        </body></html>
+    """,
+    'https://example.co.jp/company/': """
+        <html><body>
+        <table><tr><th>電話番号</th><td>03-1234-5678</td></tr></table>
+        </body></html>
+    """,
+}
+
+
+class OfflineScraper(CompanyScraper):
+    """通信せずにPAGESのHTMLを返すスクレイパー"""
+
+    def __init__(self):
+        super().__init__()
+        self.crawl_sitemap = False
+        self.crawl_early_stop = True
+
+    def _scrape_single_page(self, url: str) -> Dict:
+        html_content = PAGES[url]
+        page = self._parse_page(html_content)
+        self._extract_page(page)
+        self.page_tiers[url] = 'static'
+        page['tier'] = 'static'
+        page['size'] = len(html_content)
+        self._release_page(page)
+        return page
+
+
+class EarlyStopTest(unittest.TestCase):
+
+    def test_shape_only_value_does_not_stop_crawl(self):
+        scraper = OfflineScraper()
+        result = scraper.scrape(MAIN_URL)
+        self.assertEqual(scraper.scraped_urls, ['https://example.co.jp/company/'])
+        # 関連ページのラベル付きの値が、メインページの形だけが合う値より優先される
+        self.assertEqual(result['tel'], '03-1234-5678')
+        self.assertGreaterEqual(result['confidence']['tel'], scraper.field_confidence)
+
+    def test_labeled_values_stop_crawl(self):
+        scraper = OfflineScraper()
+        main_page = PAGES[MAIN_URL].replace(
+            '<p>お問い合わせ 03-0000-0000</p>', '<dl><dt>電話</dt><dd>03-0000-0000</dd></dl>')
+        original = dict(PAGES)
+        PAGES[MAIN_URL] = main_page
+        try:
+            result = scraper.scrape(MAIN_URL)
+        finally:
+            PAGES.update(original)
+        self.assertEqual(scraper.scraped_urls, [])
+        self.assertEqual(result['tel'], '03-0000-0000')
+
+
+if __name__ == '__main__':
+    unittest.main()
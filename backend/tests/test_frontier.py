@@ -0,0 +1,110 @@
+"""URLの正規化とクロールの待ち行列の確認"""
+import unittest
+from app.frontier import CrawlFrontier, normalize_url, parse_sitemap
+
+
+class NormalizeUrlTest(unittest.TestCase):
+
+    def test_equivalent_urls(self):
+        expected = 'https://example.co.jp/company/'
+        for url in [
+            'https://example.co.jp/company/',
+            'HTTPS://Example.co.jp/company/',
+            'https://www.example.co.jp/company/',
+            'https://example.co.jp:443/company/',
+            'https://example.co.jp/company/index.html',
+            'https://example.co.jp/company/#top',
+            'https://example.co.jp//company/',
+            'https://example.co.jp/company/?utm_source=x&gclid=y',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(normalize_url(url), expected)
+
+    def test_query_is_sorted_and_kept(self):
+        self.assertEqual(normalize_url('http://example.com/list?b=2&a=1&utm_medium=z'),
+                         'http://example.com/list?a=1&b=2')
+
+    def test_non_default_port_is_kept(self):
+        self.assertEqual(normalize_url('http://example.com:8080/about'), 'http://example.com:8080/about')
+
+    def test_empty_path(self):
+        self.assertEqual(normalize_url('https://example.com'), 'https://example.com/')
+
+    def test_unsupported_urls(self):
+        for url in ['mailto:info@example.com', 'ftp://example.com/', 'javascript:void(0)', '/relative', '']:
+            with self.subTest(url=url):
+                self.assertIsNone(normalize_url(url))
+
+
+class CrawlFrontierTest(unittest.TestCase):
+
+    def test_pops_profile_pages_first(self):
+        frontier = CrawlFrontier('https://example.com/', max_pages=10)
+        frontier.add_links([
+            ('/news/2024/01/item.html', 'お知らせ'),
+            ('/company/', '会社概要'),
+            ('/recruit/', '採用情報'),
+            ('/about/access.html', 'アクセス'),
+        ])
+        self.assertEqual(frontier.pop(2), ['https://example.com/company/', 'https://example.com/about/access.html'])
+        self.assertEqual(frontier.pop(10), ['https://example.com/recruit/'])
+
+    def test_skips_other_sites_files_and_duplicates(self):
+        frontier = CrawlFrontier('https://www.example.com/', max_pages=10)
+        added = frontier.add_links([
+            ('https://other.example.org/company/', '会社概要'),
+            ('/company/profile.pdf', '会社概要'),
+            ('mailto:info@example.com', 'お問い合わせ'),
+            ('#company', '会社概要'),
+            ('https://example.com/company/', '会社概要'),
+            ('/company/index.html', '企業情報'),
+            ('/', 'ホーム'),
+        ])
+        self.assertEqual(added, 1)
+        self.assertEqual(frontier.pop(10), ['https://example.com/company/'])
+
+    def test_better_anchor_text_raises_priority(self):
+        frontier = CrawlFrontier('https://example.com/', max_pages=10)
+        frontier.add('/outline/', 'こちら')
+        frontier.add('/access/', 'アクセス')
+        frontier.add('/outline/', '会社概要')
+        self.assertEqual(frontier.pop(1), ['https://example.com/outline/'])
+
+    def test_returns_original_url(self):
+        frontier = CrawlFrontier('https://example.com/', max_pages=10)
+        frontier.add('/company/index.html#top', '会社概要')
+        self.assertEqual(frontier.pop(1), ['https://example.com/company/index.html'])
+
+    def test_relative_links_resolve_against_base(self):
+        frontier = CrawlFrontier('https://example.com/', max_pages=10)
+        frontier.add('profile.html', '会社概要', base_url='https://example.com/company/')
+        self.assertEqual(frontier.pop(1), ['https://example.com/company/profile.html'])
+
+    def test_max_pages(self):
+        frontier = CrawlFrontier('https://example.com/', max_pages=2)
+        frontier.add_links([('/company/', '会社概要'), ('/about/', '企業情報'), ('/access/', 'アクセス')])
+        self.assertEqual(len(frontier.pop(1)), 1)
+        self.assertEqual(len(frontier.pop(5)), 1)
+        self.assertEqual(frontier.pop(5), [])
+
+
+class ParseSitemapTest(unittest.TestCase):
+
+    def test_urlset(self):
+        content = ('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                   '<url><loc> https://example.com/a </loc></url><url><loc>https://example.com/b</loc></url></urlset>')
+        self.assertEqual(parse_sitemap(content), (['https://example.com/a', 'https://example.com/b'], []))
+
+    def test_sitemap_index(self):
+        content = ('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                   '<sitemap><loc>https://example.com/sitemap-1.xml</loc></sitemap></sitemapindex>')
+        self.assertEqual(parse_sitemap(content), ([], ['https://example.com/sitemap-1.xml']))
+
+    def test_truncated_sitemap_keeps_complete_entries(self):
+        content = ('<urlset><url><loc>https://example.com/a</loc></url>'
+                   '<url><loc>https://example.com/b</loc></url><url><loc>https://exa')
+        self.assertEqual(parse_sitemap(content), (['https://example.com/a', 'https://example.com/b'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
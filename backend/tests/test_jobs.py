@@ -0,0 +1,107 @@
+"""ジョブキューの占有（リース）・再試行の確認"""
+from unittest import mock
+import tempfile
+import unittest
+import shutil
+import os
+from app.jobs import JobStore
+
+
+class JobStoreLeaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # 時刻はテストから進める
+        self.now = 1000.0
+        patcher = mock.patch('app.jobs.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = JobStore(os.path.join(self.directory, 'jobs.db'), visibility_timeout=60,
+                              max_attempts=2, retry_backoff=10)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_claimed_job_is_leased_to_one_worker(self):
+        job = self.store.submit('https://example.com/')
+        claimed = self.store.claim('worker-a')
+        self.assertEqual(claimed['id'], job['id'])
+        self.assertEqual(claimed['status'], 'running')
+        self.assertEqual(claimed['attempts'], 1)
+        self.assertEqual(claimed['lease_expires_at'], self.now + 60)
+        self.assertIsNone(self.store.claim('worker-b'))
+
+    def test_expired_lease_is_reclaimed(self):
+        job = self.store.submit('https://example.com/')
+        self.store.claim('worker-a')
+        self.now += 61
+        claimed = self.store.claim('worker-b')
+        self.assertEqual(claimed['id'], job['id'])
+        self.assertEqual(claimed['worker_id'], 'worker-b')
+        self.assertEqual(claimed['attempts'], 2)
+
+        # 期限切れ後の元のワーカーの延長・完了は反映されない
+        self.assertFalse(self.store.heartbeat(job['id'], 'worker-a'))
+        self.store.complete(job['id'], 'worker-a', {'message': 'Success'})
+        self.assertEqual(self.store.get(job['id'])['status'], 'running')
+
+    def test_heartbeat_extends_lease(self):
+        job = self.store.submit('https://example.com/')
+        self.store.claim('worker-a')
+        self.now += 50
+        self.assertTrue(self.store.heartbeat(job['id'], 'worker-a'))
+        self.now += 50
+        self.assertIsNone(self.store.claim('worker-b'))
+
+    def test_complete(self):
+        job = self.store.submit('https://example.com/', {'force': True})
+        self.store.claim('worker-a')
+        self.store.complete(job['id'], 'worker-a', {'message': 'Success'})
+        done = self.store.get(job['id'])
+        self.assertEqual(done['status'], 'succeeded')
+        self.assertEqual(done['result'], {'message': 'Success'})
+        self.assertEqual(done['options'], {'force': True})
+        self.assertIsNone(done['lease_expires_at'])
+
+    def test_retryable_failure_is_requeued_with_backoff(self):
+        job = self.store.submit('https://example.com/')
+        self.store.claim('worker-a')
+        self.store.fail(job['id'], 'worker-a', 'timeout')
+        queued = self.store.get(job['id'])
+        self.assertEqual(queued['status'], 'queued')
+        self.assertIsNone(queued['worker_id'])
+        # 初回の待ち時間は retry_backoff の前後20%
+        self.assertGreaterEqual(queued['available_at'], self.now + 8)
+        self.assertLessEqual(queued['available_at'], self.now + 12)
+        self.assertIsNone(self.store.claim('worker-a'))
+
+        self.now += 13
+        self.assertEqual(self.store.claim('worker-b')['id'], job['id'])
+        # 試行回数を使い切ったら失敗にする
+        self.store.fail(job['id'], 'worker-b', 'timeout', {'message': 'Error'})
+        failed = self.store.get(job['id'])
+        self.assertEqual(failed['status'], 'failed')
+        self.assertEqual(failed['result'], {'message': 'Error'})
+
+    def test_non_retryable_failure(self):
+        job = self.store.submit('not a url')
+        self.store.claim('worker-a')
+        self.store.fail(job['id'], 'worker-a', 'invalid', retryable=False)
+        self.assertEqual(self.store.get(job['id'])['status'], 'failed')
+
+    def test_abandoned_job_fails_after_last_attempt(self):
+        job = self.store.submit('https://example.com/')
+        self.store.claim('worker-a')
+        self.now += 61
+        self.store.claim('worker-b')
+        self.now += 61
+        # 最後の試行のワーカーも応答しなくなった
+        self.assertIsNone(self.store.claim('worker-c'))
+        failed = self.store.get(job['id'])
+        self.assertEqual(failed['status'], 'failed')
+        self.assertEqual(failed['error'], 'ワーカーが応答しなくなりました')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""LabelIndexが従来の_find_in_tableと同じ値を返すことの確認"""
+from typing import List, Optional
+import unittest
+import random
+import os
+import re
+from bs4 import BeautifulSoup  # type: ignore
+from app.label_index import LabelIndex
+from app.scraper import CompanyScraper
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'corpus')
+
+
+def find_in_table_reference(soup: BeautifulSoup, keywords: List[str]) -> Optional[str]:
+    """索引を導入する前の_find_in_tableの実装（比較用）"""
+    for keyword in keywords:
+        pattern = re.compile(keyword, re.IGNORECASE)
+        for table in soup.find_all('table'):
+            for th in table.find_all('th'):
+                if pattern.search(th.get_text(strip=True)):
+                    td = th.find_next('td')
+                    if td:
+                        return td.get_text(strip=True)
+        for dt in soup.find_all('dt'):
+            if pattern.search(dt.get_text(strip=True)):
+                dd = dt.find_next('dd')
+                if dd:
+                    return dd.get_text(strip=True)
+        for element in soup.find_all(['div', 'p', 'span']):
+            text = element.get_text(strip=True)
+            if pattern.search(text):
+                next_element = element.find_next(['div', 'p', 'span'])
+                if next_element:
+                    return next_element.get_text(strip=True)
+    return None
+
+
+# ランダムな文書の部品（ラベルのキーワード・ただのテキスト・要素）
+_WORDS = ['会社名', '社名', '所在地', '住所', '代表者', '代表取締役', '電話', 'TEL', 'tel', '営業時間',
+          '事業内容', '会社概要', '株式会社サンプル', '東京都港区1-2-3', '03-1234-5678', '9:00〜18:00', 'ようこそ', '']
+_CONTAINERS = ['div', 'p', 'span', 'section', 'li', 'dl', 'dt', 'dd', 'table', 'tr', 'th', 'td', 'a', 'b']
+
+
+def _random_html(rng: random.Random, depth: int = 0) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        if depth < 4 and rng.random() < 0.6:
+            tag = rng.choice(_CONTAINERS)
+            parts.append(f"<{tag}>{_random_html(rng, depth + 1)}</{tag}>")
+        else:
+            parts.append(rng.choice(_WORDS))
+    return ''.join(parts)
+
+
+class LabelIndexEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scraper = CompanyScraper()
+        self.keyword_sets = list(self.scraper.label_keywords.values()) + [['tel'], ['会社'], ['代表']]
+
+    def assert_equivalent(self, html: str) -> None:
+        soup = BeautifulSoup(html, 'html.parser')
+        all_keywords = [k for keywords in self.keyword_sets for k in keywords]
+        index = LabelIndex(soup, all_keywords)
+        for keywords in self.keyword_sets:
+            with self.subTest(keywords=keywords, html=html[:200]):
+                self.assertEqual(index.lookup(keywords), find_in_table_reference(soup, keywords))
+
+    def test_corpus_pages(self):
+        for company in sorted(os.listdir(CORPUS_DIR)):
+            for name in sorted(os.listdir(os.path.join(CORPUS_DIR, company))):
+                with open(os.path.join(CORPUS_DIR, company, name), encoding='utf-8') as f:
+                    self.assert_equivalent(f.read())
+
+    def test_random_documents(self):
+        rng = random.Random(20240501)
+        for _ in range(500):
+            self.assert_equivalent(f"<html><body>{_random_html(rng)}</body></html>")
+
+    def test_known_layouts(self):
+        documents = [
+            # th/tdの表
+            '<table><tr><th>会社名</th><td>株式会社A</td></tr><tr><th>所在地</th><td>東京都</td></tr></table>',
+            # 表の外のth（表のラベルとはみなさない）
+            '<th>会社名</th><td>株式会社B</td><div>会社名</div><p>株式会社C</p>',
+            # 定義リスト
+            '<dl><dt>代表者</dt><dd>山田</dd><dt>TEL</dt><dd>03-1111-2222</dd></dl>',
+            # 入れ子のブロック（最も外側のブロックの次の要素が値になる）
+            '<div><div><span>営業時間</span></div></div><p>9:00〜18:00</p>',
+            # 前のキーワードが後ろのキーワードより優先される
+            '<dl><dt>住所</dt><dd>大阪府</dd></dl><table><tr><th>所在地</th><td>東京都</td></tr></table>',
+            # 値の要素がない
+            '<table><tr><th>電話</th></tr></table>',
+        ]
+        for html in documents:
+            self.assert_equivalent(f"<html><body>{html}</body></html>")
+
+    def test_extractors_use_index(self):
+        html = ('<html><body><table><tr><th>会社名</th><td>株式会社A</td></tr>'
+                '<tr><th>電話</th><td>03-1234-5678</td></tr></table></body></html>')
+        soup = BeautifulSoup(html, 'html.parser')
+        index = self.scraper._build_label_index(soup)
+        for keywords in self.scraper.label_keywords.values():
+            self.assertEqual(self.scraper._find_in_table(soup, keywords, index),
+                             find_in_table_reference(soup, keywords))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""基本情報の確信度と値のパターンの確認"""
+import unittest
+import os
+from app.scraper import CompanyScraper
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'corpus')
+
+
+def extract_main_page(company: str):
+    """コーパスのトップページだけから基本情報と確信度を抽出"""
+    scraper = CompanyScraper()
+    with open(os.path.join(CORPUS_DIR, company, 'index.html'), encoding='utf-8') as f:
+        page = scraper._parse_page(f.read())
+    return scraper.extract_basic_info(page['soup'])
+
+
+class CorpusScoringTest(unittest.TestCase):
+    """ラベルのないトップページの値をLLMに確認させること"""
+
+    def test_beta_title_is_not_trusted_without_label(self):
+        info, confidence = extract_main_page('beta')
+        self.assertEqual(info['company_name'], 'ベータ食品株式会社')
+        self.assertLess(confidence['company_name'], CompanyScraper().field_confidence)
+
+    def test_gamma_phone_number_is_not_an_address(self):
+        info, confidence = extract_main_page('gamma')
+        self.assertEqual(info['company_name'], 'ガンマ物流株式会社')
+        self.assertNotEqual(info['address'], '777-8888')
+        threshold = CompanyScraper().field_confidence
+        for field, value in info.items():
+            if value is not None:
+                self.assertLess(confidence[field], threshold, field)
+
+
+class ScoreFieldsTest(unittest.TestCase):
+    """_score_fieldsがラベルのある値だけをしきい値に届かせること"""
+
+    def setUp(self):
+        self.scraper = CompanyScraper()
+
+    def score(self, html: str, field: str, value: str) -> float:
+        page = self.scraper._parse_page(html)
+        index = self.scraper._build_label_index(page['soup'])
+        return self.scraper._score_fields({field: value}, index)[field]
+
+    def test_shape_only_stays_below_threshold(self):
+        score = self.score('<p>お問い合わせ 03-1234-5678</p>', 'tel', '03-1234-5678')
+        self.assertLess(score, self.scraper.field_confidence)
+
+    def test_labeled_and_shaped_reaches_threshold(self):
+        html = '<table><tr><th>電話</th><td>03-1234-5678</td></tr></table>'
+        score = self.score(html, 'tel', '03-1234-5678')
+        self.assertGreaterEqual(score, self.scraper.field_confidence)
+
+
+class FieldPatternTest(unittest.TestCase):
+    """値らしさのパターンが法人格だけの名前や電話番号の一部に一致しないこと"""
+
+    def setUp(self):
+        self.patterns = CompanyScraper().field_patterns
+
+    def test_company_name_requires_name_besides_legal_form(self):
+        pattern = self.patterns['company_name']
+        for value in ['株式会社', '有限会社 ', 'Inc.', 'Corporation']:
+            self.assertIsNone(pattern.search(value), value)
+        for value in ['ベータ食品株式会社', '株式会社アルファテック', 'Gamma Logistics Inc.']:
+            self.assertIsNotNone(pattern.search(value), value)
+
+    def test_postal_code_is_not_taken_from_phone_number(self):
+        pattern = self.patterns['address']
+        for value in ['Tel: 06-7777-8888', '777-8888', '123-4567']:
+            self.assertIsNone(pattern.search(value), value)
+        for value in ['〒060-0001', '530-0001 大阪府大阪市北区', '東京都渋谷区渋谷2-21-1']:
+            self.assertIsNotNone(pattern.search(value), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
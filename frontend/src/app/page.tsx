@@ -21,11 +21,27 @@ interface CompanyInfo {
   };
 }
 
+const emptyBasicInfo: CompanyInfo['basic_info'] = {
+  company_name: '',
+  business_description: '',
+  address: '',
+  representative: '',
+  tel: '',
+  business_hours: '',
+};
+
+const emptyAnalysis: CompanyInfo['analysis'] = {
+  summary: '',
+  investor_analysis: '',
+  job_seeker_info: '',
+};
+
 export default function Home() {
   const [url, setUrl] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [companyInfo, setCompanyInfo] = useState<CompanyInfo | null>(null);
   const [activeTab, setActiveTab] = useState('basic');
+  const [progress, setProgress] = useState('');
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -36,27 +52,68 @@ export default function Home() {
 
     setIsLoading(true);
     setCompanyInfo(null);
+    setProgress('ページを取得しています...');
 
-    try {
-      const response = await fetch('http://localhost:8000/api/scrape', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ url }),
-      });
-
-      const data = await response.json();
-      if (data.error) {
-        throw new Error(data.error);
-      }
+    // 処理の段階ごとに届く結果を順に表示する
+    const source = new EventSource(
+      `http://localhost:8000/api/scrape/stream?url=${encodeURIComponent(url)}`
+    );
+    let finished = false;
+    let relatedPages = 0;
+
+    const finish = () => {
+      finished = true;
+      source.close();
+      setIsLoading(false);
+      setProgress('');
+    };
+
+    source.addEventListener('main_page', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setCompanyInfo({ basic_info: { ...emptyBasicInfo, ...data.basic_info }, analysis: emptyAnalysis });
+      setProgress('関連ページを取得しています...');
+    });
+
+    source.addEventListener('related_page', () => {
+      relatedPages += 1;
+      setProgress(`関連ページを取得しています...（${relatedPages}件完了）`);
+    });
+
+    source.addEventListener('basic_info', (event) => {
+      const basicInfo = JSON.parse((event as MessageEvent).data);
+      setCompanyInfo((prev) => ({
+        basic_info: { ...emptyBasicInfo, ...basicInfo },
+        analysis: prev?.analysis ?? emptyAnalysis,
+      }));
+      setProgress('AIが分析しています...');
+    });
+
+    source.addEventListener('analysis_partial', (event) => {
+      const { field, text } = JSON.parse((event as MessageEvent).data);
+      setCompanyInfo((prev) => prev && ({
+        ...prev,
+        analysis: { ...prev.analysis, [field]: text },
+      }));
+    });
+
+    source.addEventListener('done', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
       setCompanyInfo(data);
       toast.success('企業情報を取得しました');
-    } catch (error) {
-      toast.error('エラーが発生しました: ' + (error as Error).message);
-    } finally {
-      setIsLoading(false);
-    }
+      finish();
+    });
+
+    source.addEventListener('error', (event) => {
+      if (finished) {
+        return;
+      }
+      // サーバーから送られたエラーイベントか、接続自体のエラーか
+      const message = (event as MessageEvent).data
+        ? JSON.parse((event as MessageEvent).data).error
+        : '接続が切断されました';
+      toast.error('エラーが発生しました: ' + message);
+      finish();
+    });
   };
 
   return (
@@ -98,6 +155,13 @@ export default function Home() {
           </div>
         </motion.form>
 
+        {isLoading && progress && (
+          <div className="flex items-center justify-center gap-2 mb-6 text-gray-400">
+            <FiLoader className="animate-spin" />
+            {progress}
+          </div>
+        )}
+
         {companyInfo && (
           <motion.div
             initial={{ opacity: 0, y: 20 }}